@@ -1,5 +1,35 @@
 import express from "express";
+import http from "http";
+import config from "./utils/config";
 
 const app = express();
 
+/* headers passed through to the read service, for compression and revalidation */
+const READ_HEADERS = ["accept-encoding", "if-none-match"];
+
+/* forward /api reads to the data scraper's in-memory read service */
+app.get("/api/*", (req, res) => {
+  const headers: http.OutgoingHttpHeaders = {};
+  READ_HEADERS.forEach((name) => {
+    if (req.headers[name]) headers[name] = req.headers[name];
+  });
+
+  const upstream = http.request(
+    {
+      host: "127.0.0.1",
+      port: config.READ_PORT,
+      path: req.originalUrl.replace(/^\/api/, ""),
+      headers,
+    },
+    (reply) => {
+      res.writeHead(reply.statusCode || 502, reply.headers);
+      reply.pipe(res);
+    }
+  );
+  upstream.on("error", () => {
+    if (!res.headersSent) res.status(503).json({ error: "read service unavailable" });
+  });
+  upstream.end();
+});
+
 export default app;
@@ -0,0 +1,151 @@
+# ###################################################################################
+# per-asset output writer for the xG data scraper
+# ###################################################################################
+# Each refreshed asset's outputs (fpl detailed data plus its groups, stats, shot and
+# matches data) are assembled into one bundle in memory and written once. Output
+# format, set with SCRAPER_OUTPUT_FORMAT:
+#   pretty   one file per dataset, asset_<id>_<name>.json, indented as before
+#   compact  the same files written with compact separators
+#   archive  one zip per run, asset_bundles.zip, holding a compact asset_<id>.json
+#            bundle per asset. Bundles of assets not refreshed carry over from the
+#            previous archive.
+# Files are written to a temp file and moved into place with os.replace, so a crash
+# never leaves an output missing or half written. Fsync policy, set with
+# SCRAPER_FSYNC: never (default), always (each file before it is moved into place)
+# or end (once at the end of each run).
+import json
+import logging
+import os
+import zipfile
+
+OUTPUT_FORMAT = os.environ.get('SCRAPER_OUTPUT_FORMAT', 'pretty')
+FSYNC_POLICY = os.environ.get('SCRAPER_FSYNC', 'never')
+
+DATADIR = 'src/scraper/data'
+ARCHIVE_FILE = DATADIR + '/asset_bundles.zip'
+
+# output directory for each dataset in a bundle
+DATASET_DIRS = {
+    'fpldetaileddata': DATADIR + '/fpldetaileddata',
+    'groupsdata': DATADIR + '/groupsdata',
+    'statsdata': DATADIR + '/statsdata',
+    'shotdata': DATADIR + '/shotdata',
+    'matchesdata': DATADIR + '/matchesdata',
+}
+
+
+def dumps(data, compact):
+    if compact:
+        return json.dumps(data, separators=(',', ':'))
+    return json.dumps(data, indent=4, sort_keys=True)
+
+
+class AssetWriter:
+    def __init__(self, output_format=OUTPUT_FORMAT, fsync=FSYNC_POLICY, archive_file=ARCHIVE_FILE):
+        if output_format not in ('pretty', 'compact', 'archive'):
+            raise ValueError(f'Unknown output format {output_format}')
+        if fsync not in ('never', 'always', 'end'):
+            raise ValueError(f'Unknown fsync policy {fsync}')
+
+        self.output_format = output_format
+        self.fsync = fsync
+        self.archive_file = archive_file
+
+        # archive being written this run, and the ids of the bundles written to it
+        self.archive = None
+        self.written = set()
+
+        # archive written by the previous run, read for assets not refreshed
+        self.previous = None
+        if output_format == 'archive' and os.path.isfile(archive_file):
+            self.previous = zipfile.ZipFile(archive_file)
+
+    def _bundle_name(self, asset_id):
+        return 'asset_' + str(asset_id) + '.json'
+
+    def _path(self, asset_id, name):
+        return DATASET_DIRS[name] + '/asset_' + str(asset_id) + '_' + name + '.json'
+
+    def _previous_bundle(self, asset_id):
+        if self.previous is None or self._bundle_name(asset_id) not in self.previous.NameToInfo:
+            return {}
+        return json.loads(self.previous.read(self._bundle_name(asset_id)))
+
+    # write a file via a temp file moved into place, synced first if policy says so
+    def _write_file(self, path, content):
+        temp_path = path + '.temp'
+        with open(temp_path, 'w') as outfile:
+            outfile.write(content)
+            if self.fsync == 'always':
+                outfile.flush()
+                os.fsync(outfile.fileno())
+        os.replace(temp_path, path)
+
+    # write an asset's bundle of {dataset name: data}. In archive mode, datasets
+    # missing from the bundle keep their value from the previous run
+    def write(self, asset_id, bundle):
+        if self.output_format != 'archive':
+            compact = self.output_format == 'compact'
+            for name, data in bundle.items():
+                self._write_file(self._path(asset_id, name), dumps(data, compact))
+            return
+
+        if self.archive is None:
+            self.archive = zipfile.ZipFile(self.archive_file + '.temp', 'w', zipfile.ZIP_DEFLATED)
+        full_bundle = self._previous_bundle(asset_id)
+        full_bundle.update(bundle)
+        self.archive.writestr(self._bundle_name(asset_id), dumps(full_bundle, compact=True))
+        self.written.add(self._bundle_name(asset_id))
+
+    # stored dataset of an asset, or None if there is none
+    def read(self, asset_id, name):
+        if self.output_format == 'archive':
+            return self._previous_bundle(asset_id).get(name)
+        path = self._path(asset_id, name)
+        if not os.path.isfile(path):
+            return None
+        with open(path) as infile:
+            return json.load(infile)
+
+    def has(self, asset_id, name):
+        if self.output_format == 'archive':
+            return name in self._previous_bundle(asset_id)
+        return os.path.isfile(self._path(asset_id, name))
+
+    # finish the run's outputs, moving the new archive into place
+    def commit(self):
+        if self.archive is not None:
+            # carry over bundles of assets not refreshed this run
+            if self.previous is not None:
+                for info in self.previous.infolist():
+                    if info.filename not in self.written:
+                        self.archive.writestr(info, self.previous.read(info.filename))
+                self.previous.close()
+                self.previous = None
+
+            self.archive.close()
+            self.archive = None
+            self.written = set()
+            if self.fsync != 'never':
+                with open(self.archive_file + '.temp', 'rb') as infile:
+                    os.fsync(infile.fileno())
+            os.replace(self.archive_file + '.temp', self.archive_file)
+            self.previous = zipfile.ZipFile(self.archive_file)
+
+        elif self.fsync == 'end':
+            os.sync()
+
+    # drop a partly written archive after a failed run
+    def abort(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+            self.written = set()
+            os.remove(self.archive_file + '.temp')
+            logging.warning('Discarded partly written asset archive')
+
+    def close(self):
+        self.abort()
+        if self.previous is not None:
+            self.previous.close()
+            self.previous = None
@@ -0,0 +1,102 @@
+# ###################################################################################
+# multi-league, multi-season backfill for the xG data scraper
+# ###################################################################################
+# Every league x season cell of the matrix is fetched and aggregated concurrently
+# and written as its own partition under BACKFILL_DIR/<league>/<season>/. A
+# partition is only complete once its manifest has been written, so an interrupted
+# backfill resumes by redoing just the cells without one.
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import json
+import logging
+import os
+import time
+
+from fetcher import WORKERS, cache, fetch_payloads
+from page_parser import LEAGUE_PAGE_PAYLOADS
+from pipeline import build_league_table, league_url
+
+BACKFILL_DIR = 'src/scraper/data/backfill'
+
+# written last, marking a partition as complete
+MANIFEST_FILE = '_manifest.json'
+
+
+def partition_dir(league, season, root=BACKFILL_DIR):
+    return os.path.join(root, league, season)
+
+
+def is_complete(league, season, root=BACKFILL_DIR):
+    return os.path.isfile(os.path.join(partition_dir(league, season, root), MANIFEST_FILE))
+
+
+# write a file via a temp file, so a partition never holds a half written file
+def write_file(path, write):
+    temp_path = path + '.temp'
+    with open(temp_path, 'w') as outfile:
+        write(outfile)
+    os.replace(temp_path, path)
+
+
+# fetch, aggregate and write a single league season partition, returning its manifest
+def backfill_partition(league, season, root=BACKFILL_DIR):
+    payloads = fetch_payloads(league_url(league, season), LEAGUE_PAGE_PAYLOADS)
+    league_table = build_league_table(payloads['teamsData'])
+
+    directory = partition_dir(league, season, root)
+    os.makedirs(directory, exist_ok=True)
+
+    # remove any manifest left by a previous backfill before rewriting the partition
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    if os.path.isfile(manifest_path):
+        os.remove(manifest_path)
+
+    write_file(os.path.join(directory, 'league_table.csv'), league_table.to_csv)
+    write_file(os.path.join(directory, 'teams.json'), lambda outfile: json.dump(payloads['teamsData'], outfile))
+    write_file(os.path.join(directory, 'players.json'), lambda outfile: json.dump(payloads['playersData'], outfile))
+
+    manifest = {
+        'league': league,
+        'season': season,
+        'teams': len(payloads['teamsData']),
+        'players': len(payloads['playersData']),
+        'completed_at': datetime.now().isoformat(),
+    }
+    write_file(manifest_path, lambda outfile: json.dump(manifest, outfile, indent=4))
+    return manifest
+
+
+# backfill every league season in the matrix, skipping complete partitions unless
+# forced, and return a summary of the backfill
+def run_backfill(leagues, seasons, root=BACKFILL_DIR, workers=WORKERS, force=False):
+    started = time.time()
+    cells = [(league, season) for league in leagues for season in seasons]
+    pending = [cell for cell in cells if force or not is_complete(*cell, root)]
+    logging.info(f'Backfilling {len(pending)} of {len(cells)} league season partitions')
+
+    completed = []
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(backfill_partition, league, season, root): (league, season) for league, season in pending}
+        for future in as_completed(futures):
+            league, season = futures[future]
+            try:
+                future.result()
+                completed.append(f'{league}/{season}')
+            except Exception as err:
+                logging.error(f'Backfill failed for {league} {season}: {err}')
+                failed.append(f'{league}/{season}')
+
+    # persist the response cache index, so a resumed backfill reuses fetched pages
+    if cache is not None:
+        cache.save()
+
+    summary = {
+        'partitions': len(cells),
+        'skipped': len(cells) - len(pending),
+        'completed': len(completed),
+        'failed': sorted(failed),
+        'elapsed': round(time.time() - started, 3),
+    }
+    logging.info(f'Backfill summary: {summary}')
+    return summary
@@ -0,0 +1,117 @@
+# ###################################################################################
+# micro-benchmark: understat page payload extraction
+# ###################################################################################
+# Compares the single pass byte scanner in page_parser against the previous
+# BeautifulSoup based extraction, on saved understat pages or on a synthetic
+# player page of realistic size. Run from the project root:
+#
+#   python3 src/scraper/bench/bench_page_parser.py [page.html ...] [--repeat N]
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from page_parser import LEAGUE_PAGE_PAYLOADS, PLAYER_PAGE_PAYLOADS, extract_payloads  # noqa: E402
+
+
+# previous extraction path: full lxml tree, then a substring scan of every script
+def extract_payloads_soup(content, names):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, "lxml")
+    payloads = {}
+    for script in soup.find_all('script'):
+        for name in names:
+            if name in str(script.string):
+                string_with_json_obj = script.string.strip()
+                ind_start = string_with_json_obj.index("('")+2
+                ind_end = string_with_json_obj.index("')")
+                json_data = string_with_json_obj[ind_start:ind_end]
+                json_data = json_data.encode('utf8').decode('unicode_escape')
+                payloads[name] = json.loads(json_data)
+    return payloads
+
+
+# hex escape a JSON string the way understat does
+def understat_escape(text):
+    return ''.join(
+        ch if ch.isalnum() or ord(ch) > 127 else '\\x%02X' % ord(ch)
+        for ch in text
+    )
+
+
+# synthetic player page with a few hundred shots and matches
+def synthetic_player_page(shots=300, matches=150):
+    rng = random.Random(0)
+    payloads = {
+        'groupsData': {'season': [{'season': str(2014 + i), 'goals': str(rng.randint(0, 30))} for i in range(9)]},
+        'minMaxPlayerStats': {stat: {'min': '0', 'max': str(rng.random())} for stat in ('goals', 'xG', 'shots', 'xA')},
+        'shotsData': [{
+            'id': str(i), 'minute': str(rng.randint(1, 90)), 'result': 'SavedShot',
+            'X': str(rng.random()), 'Y': str(rng.random()), 'xG': str(rng.random()),
+            'player': 'Martin Ødegaard', 'situation': 'OpenPlay', 'season': '2022',
+            'shotType': 'LeftFoot', 'match_id': str(i // 3), 'h_team': 'Arsenal', 'a_team': 'Chelsea',
+        } for i in range(shots)],
+        'matchesData': [{
+            'id': str(i), 'goals': '0', 'shots': '2', 'xG': str(rng.random()), 'time': '90',
+            'position': 'AMC', 'h_team': 'Arsenal', 'a_team': 'Chelsea', 'date': '2022-08-05',
+        } for i in range(matches)],
+    }
+    scripts = ''.join(
+        "<script>\n\tvar %s = JSON.parse('%s');\n</script>\n" % (name, understat_escape(json.dumps(data)))
+        for name, data in payloads.items()
+    )
+    filler = ''.join('<div class="row"><span>%d</span></div>' % i for i in range(2000))
+    return ('<html><head><script src="/js/app.js"></script></head><body>'
+            + filler + scripts + '</body></html>').encode('utf8')
+
+
+# time an extractor over the pages, returning (ms per page, peak KiB)
+def measure(extract, pages, names, repeat):
+    tracemalloc.start()
+    extract(pages[0], names)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            extract(page, names)
+    elapsed = time.perf_counter() - started
+    return elapsed * 1000 / (repeat * len(pages)), peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark understat payload extraction')
+    parser.add_argument('pages', nargs='*', help='saved understat pages, defaults to a synthetic player page')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, 'rb') as infile:
+                pages.append(infile.read())
+    else:
+        pages = [synthetic_player_page()]
+
+    names = PLAYER_PAGE_PAYLOADS + LEAGUE_PAGE_PAYLOADS
+    results = {
+        'soup': measure(extract_payloads_soup, pages, names, args.repeat),
+        'scanner': measure(extract_payloads, pages, names, args.repeat),
+    }
+
+    size = sum(len(page) for page in pages) / len(pages) / 1024
+    print(f'{len(pages)} page(s), {size:.0f} KiB average, {args.repeat} repeats')
+    for label, (ms, peak) in results.items():
+        print(f'{label:>8}: {ms:8.2f} ms/page  {peak:10.0f} KiB peak')
+    print(f' speedup: {results["soup"][0] / results["scanner"][0]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
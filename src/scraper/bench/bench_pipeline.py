@@ -0,0 +1,158 @@
+# ###################################################################################
+# end to end benchmark: full scrape runs against a local replay server
+# ###################################################################################
+# Scales the recorded response fixtures (or synthetic ones, see fixtures.py) up to
+# each requested number of assets, serves them from a local replay server with
+# the given latency and error rate, and runs the pipeline against it in a fresh
+# working directory with an in-memory Firestore. Reports wall time, throughput,
+# request counts, peak memory and per-stage timings for every run. Run from the
+# project root:
+#
+#   python3 src/scraper/bench/bench_pipeline.py [--assets 700 3000 10000]
+#       [--latency-ms 50] [--jitter-ms 20] [--error-rate 0.01] [--runs 2]
+#       [--rate-limits] [--output report.json]
+#
+# Per-host rate limits are lifted unless --rate-limits is given, so runs measure
+# the scraper rather than the configured request rate. Runs after the first are
+# incremental, against the response cache left by the previous run.
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRAPER_DIR = os.path.dirname(BENCH_DIR)
+
+# stages listed for each run, slowest first
+REPORTED_STAGES = 8
+
+
+# ###################################################################################
+# child process: run the pipeline in the current directory against the server
+# ###################################################################################
+# The scraper modules are imported here rather than at the top of the file, as the
+# pipeline's spawned parse workers re-import this script.
+def run_child(runs, rate_limits):
+    sys.path.insert(0, SCRAPER_DIR)
+    import fetcher
+    from firestore_sink import MemoryFirestore
+    from http_client import HOST_RATE_LIMITS
+    from pipeline import Pipeline, configure_logging
+
+    configure_logging()
+    if not rate_limits:
+        fetcher.client.rate_limits = {host: (1e9, 1e9) for host in HOST_RATE_LIMITS}
+
+    db = MemoryFirestore()
+    pipeline = Pipeline(db=db)
+    results = []
+    try:
+        for run in range(runs):
+            summary = pipeline.run(incremental=run > 0)
+            summary['documents'] = len(db.documents)
+            summary['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            summary['children_peak_rss_kb'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+            results.append(summary)
+    finally:
+        pipeline.close()
+
+    print(json.dumps(results))
+
+
+# ###################################################################################
+# driver: build fixtures, serve them and run the child at each scale
+# ###################################################################################
+def bench_scale(templates, assets, args):
+    from fixtures import scale
+    from replay_server import ReplayServer
+
+    routes = scale(templates, assets)
+    server = ReplayServer(
+        routes, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, error_rate=args.error_rate
+    ).start()
+    workdir = tempfile.mkdtemp(prefix='xgdata-bench-')
+    try:
+        command = [sys.executable, os.path.abspath(__file__), '--child', '--runs', str(args.runs)]
+        if args.rate_limits:
+            command.append('--rate-limits')
+        env = dict(os.environ, SCRAPER_HTTP_UPSTREAM=server.url)
+        started = time.time()
+        output = subprocess.run(command, cwd=workdir, env=env, check=True, stdout=subprocess.PIPE).stdout
+        elapsed = time.time() - started
+    finally:
+        server.stop()
+        if args.keep:
+            print(f'Kept working directory {workdir}')
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'assets': assets,
+        'routes': len(routes),
+        'bytes': sum(len(body) for body in routes.values()),
+        'process_elapsed': round(elapsed, 3),
+        'server': server.stats(),
+        'runs': json.loads(output.splitlines()[-1]),
+    }
+
+
+def print_report(results):
+    print(f'{"assets":>7} {"run":>4} {"elapsed s":>10} {"assets/s":>9} {"requests":>9} {"retries":>8} '
+          f'{"errors":>7} {"peak MiB":>9}')
+    for result in results:
+        for number, run in enumerate(result['runs']):
+            print(f'{result["assets"]:>7} {number:>4} {run["elapsed"]:>10.2f} '
+                  f'{run["refreshed"] / max(run["elapsed"], 1e-9):>9.1f} {run["http"]["requests"]:>9} '
+                  f'{run["http"]["retries"]:>8} {run["http"]["errors"]:>7} {run["peak_rss_kb"] / 1024:>9.0f}')
+
+    for result in results:
+        for number, run in enumerate(result['runs']):
+            print(f'\n{result["assets"]} assets, run {number}:')
+            stages = sorted(run['stages'].items(), key=lambda item: item[1]['seconds'], reverse=True)
+            for stage, counter in stages[:REPORTED_STAGES]:
+                per_call = counter['seconds'] * 1000 / counter['calls']
+                print(f'  {stage:>18} {counter["calls"]:>7} calls {counter["seconds"]:>9.3f} s '
+                      f'{per_call:>9.2f} ms/call')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark full scrape runs against a local replay server')
+    parser.add_argument('--assets', type=int, nargs='+', default=[700, 3000, 10000])
+    parser.add_argument('--latency-ms', type=float, default=50, help='mean response latency')
+    parser.add_argument('--jitter-ms', type=float, default=20, help='latency varies by up to this much')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 503')
+    parser.add_argument('--runs', type=int, default=2, help='runs per scale, the first full, then incremental')
+    parser.add_argument('--rate-limits', action='store_true', help='keep the per-host rate limits')
+    parser.add_argument('--recorded-only', action='store_true', help='fail rather than use synthetic fixtures')
+    parser.add_argument('--output', help='write the full report as JSON')
+    parser.add_argument('--keep', action='store_true', help='keep each working directory')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.runs, args.rate_limits)
+        return
+
+    from fixtures import load_recorded, synthetic_templates
+
+    templates = load_recorded()
+    if templates is None:
+        if args.recorded_only:
+            sys.exit('No recorded fixtures, run fixtures.py record first')
+        templates = synthetic_templates()
+
+    results = [bench_scale(templates, assets, args) for assets in args.assets]
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(results, outfile, indent=4, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
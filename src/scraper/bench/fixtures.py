@@ -0,0 +1,289 @@
+# ###################################################################################
+# recorded and scaled response fixtures for the pipeline benchmark
+# ###################################################################################
+# Records a representative sample of the responses a scrape run makes
+# (bootstrap-static, fixtures, element-summary, the understat league page and
+# player pages) into FIXTURES_DIR, then scales them up to any number of assets for
+# the replay server. Without a recording, synthetic templates of the same shape
+# are used instead, so the benchmark runs fully offline. To record, from the
+# project root:
+#
+#   python3 src/scraper/bench/fixtures.py record [--samples 40]
+import argparse
+import json
+import os
+import random
+import re
+import sys
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from page_parser import LEAGUE_PAGE_PAYLOADS, extract_payloads  # noqa: E402
+from pipeline import (  # noqa: E402
+    asset_data_url, fpl_asset_data_url, fpl_fixtures_url, fpl_league, fpl_season, fpl_url, league_url
+)
+from team_registry import KNOWN_TEAMS  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# share of scaled assets given no understat player, as with real squads
+UNMATCHED_SHARE = 0.1
+
+# characters understat leaves unescaped in its JSON.parse('...') payloads
+UNDERSTAT_ESCAPED = re.compile('[^0-9A-Za-z\u0080-\U0010ffff]')
+
+
+# url path of a url, as served by the replay server under /<host><path>
+def route(url):
+    return '/' + url.split('://', 1)[1]
+
+
+# understat style page holding the given {name: payload} JSON variables
+def understat_page(payloads):
+    scripts = ''.join(
+        "<script>\n\tvar %s = JSON.parse('%s');\n</script>\n" % (
+            name, UNDERSTAT_ESCAPED.sub(lambda match: '\\x%02X' % ord(match.group()), json.dumps(data))
+        )
+        for name, data in payloads.items()
+    )
+    return ('<html><head><script src="/js/app.js"></script></head><body>' + scripts + '</body></html>').encode()
+
+
+# ###################################################################################
+# record a sample of live responses as templates
+# ###################################################################################
+def record(samples, fixtures_dir=FIXTURES_DIR):
+    session = requests.Session()
+
+    def get(url):
+        res = session.get(url, timeout=30)
+        res.raise_for_status()
+        return res.content
+
+    os.makedirs(os.path.join(fixtures_dir, 'element-summary'), exist_ok=True)
+    os.makedirs(os.path.join(fixtures_dir, 'player'), exist_ok=True)
+
+    bootstrap = get(fpl_url)
+    with open(os.path.join(fixtures_dir, 'bootstrap-static.json'), 'wb') as outfile:
+        outfile.write(bootstrap)
+    with open(os.path.join(fixtures_dir, 'fixtures.json'), 'wb') as outfile:
+        outfile.write(get(fpl_fixtures_url))
+    league = get(league_url(fpl_league, fpl_season))
+    with open(os.path.join(fixtures_dir, 'league.html'), 'wb') as outfile:
+        outfile.write(league)
+
+    elements = json.loads(bootstrap)['elements']
+    for element in random.Random(0).sample(elements, min(samples, len(elements))):
+        path = os.path.join(fixtures_dir, 'element-summary', f'{element["id"]}.json')
+        with open(path, 'wb') as outfile:
+            outfile.write(get(fpl_asset_data_url + str(element['id']) + '/'))
+
+    players = extract_payloads(league, LEAGUE_PAGE_PAYLOADS)['playersData']
+    for player in random.Random(0).sample(players, min(samples, len(players))):
+        with open(os.path.join(fixtures_dir, 'player', f'{player["id"]}.html'), 'wb') as outfile:
+            outfile.write(get(asset_data_url + '/' + player['id']))
+
+
+# recorded templates, or None when nothing has been recorded
+def load_recorded(fixtures_dir=FIXTURES_DIR):
+    if not os.path.isfile(os.path.join(fixtures_dir, 'bootstrap-static.json')):
+        return None
+
+    def load(*path):
+        with open(os.path.join(fixtures_dir, *path), 'rb') as infile:
+            return infile.read()
+
+    summaries_dir = os.path.join(fixtures_dir, 'element-summary')
+    players_dir = os.path.join(fixtures_dir, 'player')
+    return {
+        'bootstrap': json.loads(load('bootstrap-static.json')),
+        'fixtures': json.loads(load('fixtures.json')),
+        'league': extract_payloads(load('league.html'), LEAGUE_PAGE_PAYLOADS),
+        'summaries': [json.loads(load('element-summary', name)) for name in sorted(os.listdir(summaries_dir))],
+        'player_pages': [load('player', name) for name in sorted(os.listdir(players_dir))],
+    }
+
+
+# ###################################################################################
+# synthetic templates, shaped like the recorded responses
+# ###################################################################################
+def synthetic_templates(players=40):
+    rng = random.Random(0)
+    # twenty clubs the team registry knows, named after their understat ids
+    known_teams = list(KNOWN_TEAMS.items())[:20]
+    teams = [
+        {'id': number, 'code': code, 'name': f'Club {team_id}', 'short_name': f'C{team_id}'}
+        for number, (team_id, code) in enumerate(known_teams, 1)
+    ]
+    events = [
+        {
+            'id': gameweek, 'deadline_time': f'2022-08-{gameweek + 4:02d}T17:30:00Z', 'finished': gameweek < 5,
+            'data_checked': gameweek < 5, 'is_current': gameweek == 4, 'is_next': gameweek == 5,
+        }
+        for gameweek in range(1, 39)
+    ]
+    fixtures = []
+    for gameweek in range(1, 7):
+        for home in range(0, len(teams), 2):
+            fixtures.append({
+                'id': len(fixtures) + 1, 'event': gameweek, 'kickoff_time': f'2022-08-{gameweek + 5:02d}T14:00:00Z',
+                'team_h': teams[home]['id'], 'team_a': teams[home + 1]['id'],
+                'team_h_difficulty': rng.randint(2, 5), 'team_a_difficulty': rng.randint(2, 5),
+                'finished': gameweek < 5, 'finished_provisional': gameweek < 5, 'started': gameweek < 5,
+                'team_h_score': rng.randint(0, 3) if gameweek < 5 else None,
+                'team_a_score': rng.randint(0, 3) if gameweek < 5 else None,
+            })
+
+    elements = [
+        {
+            'id': number, 'code': 100000 + number, 'web_name': '', 'first_name': '', 'second_name': '',
+            'team': 1, 'team_code': teams[0]['code'], 'element_type': rng.randint(1, 4),
+            'now_cost': rng.randint(40, 130), 'minutes': rng.choice([0, 90, 270, 360]),
+            'total_points': rng.randint(0, 40), 'goals_scored': rng.randint(0, 4), 'assists': rng.randint(0, 3),
+            'form': f'{rng.random() * 8:.1f}', 'selected_by_percent': f'{rng.random() * 30:.1f}',
+        }
+        for number in range(1, players + 1)
+    ]
+
+    teams_data = {}
+    for team_id, _ in known_teams:
+        history = []
+        for gameweek in range(4):
+            scored, missed = rng.randint(0, 3), rng.randint(0, 3)
+            history.append({
+                'h_a': 'h' if gameweek % 2 else 'a', 'xG': rng.random() * 3, 'xGA': rng.random() * 2,
+                'npxG': rng.random() * 2.5, 'npxGA': rng.random() * 2, 'npxGD': rng.random() - 0.5,
+                'ppda': {'att': rng.randint(150, 350), 'def': rng.randint(10, 40)},
+                'ppda_allowed': {'att': rng.randint(150, 350), 'def': rng.randint(10, 40)},
+                'deep': rng.randint(2, 12), 'deep_allowed': rng.randint(2, 12), 'scored': scored, 'missed': missed,
+                'xpts': rng.random() * 3, 'result': 'w' if scored > missed else 'd' if scored == missed else 'l',
+                'date': f'2022-08-{gameweek * 7 + 6:02d} 15:00:00', 'wins': int(scored > missed),
+                'draws': int(scored == missed), 'loses': int(scored < missed),
+                'pts': 3 if scored > missed else int(scored == missed),
+            })
+        teams_data[team_id] = {'id': team_id, 'title': f'Club {team_id}', 'history': history}
+
+    league_players = [
+        {
+            'id': str(number), 'player_name': '', 'games': '4', 'time': str(rng.randint(0, 360)),
+            'goals': str(rng.randint(0, 4)), 'xG': str(rng.random() * 4), 'assists': str(rng.randint(0, 3)),
+            'xA': str(rng.random() * 2), 'shots': str(rng.randint(0, 20)), 'key_passes': str(rng.randint(0, 10)),
+            'yellow_cards': '0', 'red_cards': '0', 'position': rng.choice(['F S', 'M S', 'D S', 'GK']),
+            'team_title': '', 'npg': str(rng.randint(0, 3)), 'npxG': str(rng.random() * 3),
+            'xGChain': str(rng.random() * 3), 'xGBuildup': str(rng.random()),
+        }
+        for number in range(1, players + 1)
+    ]
+
+    # each page's shots and matches are between two of the league's clubs, so they
+    # are kept by the shot maps, which bin only the fpl league's teams
+    titles = [teams_data[team_id]['title'] for team_id, _ in known_teams]
+    player_pages = []
+    for number in range(players):
+        h_team, a_team = titles[number % len(titles)], titles[(number + 1) % len(titles)]
+        shots = [
+            {
+                'id': str(shot), 'minute': str(rng.randint(1, 90)),
+                'result': rng.choice(['Goal', 'SavedShot', 'MissedShots', 'BlockedShot', 'ShotOnPost']),
+                'X': str(rng.uniform(0.65, 0.99)), 'Y': str(rng.uniform(0.2, 0.8)), 'xG': str(rng.random() * 0.6),
+                'player': 'Template Player', 'h_a': rng.choice(['h', 'a']), 'player_id': str(number),
+                'situation': rng.choice(['OpenPlay', 'FromCorner', 'SetPiece', 'DirectFreekick', 'Penalty']),
+                'season': str(2014 + shot % 9), 'shotType': rng.choice(['RightFoot', 'LeftFoot', 'Head']),
+                'match_id': str(10000 + shot // 3), 'h_team': h_team, 'a_team': a_team, 'h_goals': '1',
+                'a_goals': '0', 'date': '2022-08-06 15:00:00', 'player_assisted': None, 'lastAction': 'Pass',
+            }
+            for shot in range(rng.randint(0, 300))
+        ]
+        matches = [
+            {
+                'id': str(10000 + match), 'season': str(2014 + match % 9), 'date': '2022-08-06',
+                'position': 'FW', 'time': str(rng.randint(1, 90)), 'goals': str(rng.randint(0, 2)),
+                'shots': str(rng.randint(0, 6)), 'assists': '0', 'key_passes': str(rng.randint(0, 4)),
+                'npg': '0', 'xG': str(rng.random()), 'xA': str(rng.random()), 'npxG': str(rng.random()),
+                'xGChain': str(rng.random()), 'xGBuildup': str(rng.random()), 'h_team': h_team,
+                'a_team': a_team, 'h_goals': '1', 'a_goals': '0', 'roster_id': str(match),
+            }
+            for match in range(rng.randint(0, 250))
+        ]
+        player_pages.append(understat_page({
+            'groupsData': {'season': [{'season': str(2014 + season), 'goals': '1'} for season in range(9)]},
+            'minMaxPlayerStats': {stat: {'min': '0', 'max': str(rng.random())} for stat in ('goals', 'xG', 'xA')},
+            'shotsData': shots,
+            'matchesData': matches,
+        }))
+
+    summaries = [
+        {
+            'fixtures': [fixture for fixture in fixtures if not fixture['finished']][:5],
+            'history': [{'element': 0, 'round': gameweek, 'total_points': rng.randint(0, 12)} for gameweek in range(4)],
+            'history_past': [{'season_name': f'20{year}/{year + 1}', 'total_points': rng.randint(0, 200)}
+                             for year in range(14, 22)],
+        }
+        for _ in range(players)
+    ]
+
+    return {
+        'bootstrap': {'events': events, 'teams': teams, 'elements': elements, 'element_types': []},
+        'fixtures': fixtures,
+        'league': {'teamsData': teams_data, 'playersData': league_players},
+        'summaries': summaries,
+        'player_pages': player_pages,
+    }
+
+
+# ###################################################################################
+# scale templates up to a run over the given number of assets
+# ###################################################################################
+# Returns {route: body} for every url the run fetches. Assets are spread over the
+# teams, each with a unique name matched by an understat player, bar UNMATCHED_SHARE
+# of them. Player pages cycle through the templates, each made unique so the parse
+# memo does not serve them from the cache.
+def scale(templates, assets):
+    title_by_code = {
+        KNOWN_TEAMS[team_id]: team['title'] for team_id, team in templates['league']['teamsData'].items()
+        if team_id in KNOWN_TEAMS
+    }
+    teams = [team for team in templates['bootstrap']['teams'] if team['code'] in title_by_code]
+    elements, league_players, routes = [], [], {}
+    summaries = [json.dumps(summary).encode() for summary in templates['summaries']]
+
+    for number in range(assets):
+        team = teams[number % len(teams)]
+        name = f'Bench{number:05d}'
+        element = dict(templates['bootstrap']['elements'][number % len(templates['bootstrap']['elements'])])
+        element.update(
+            id=number + 1, code=900000 + number, team=team['id'], team_code=team['code'],
+            web_name=name, first_name='Asset', second_name=name,
+        )
+        elements.append(element)
+        routes[route(fpl_asset_data_url + str(element['id']) + '/')] = summaries[number % len(summaries)]
+
+        if number % int(1 / UNMATCHED_SHARE) == 0:
+            continue
+        player = dict(templates['league']['playersData'][number % len(templates['league']['playersData'])])
+        player.update(id=str(700000 + number), player_name='Asset ' + name, team_title=title_by_code[team['code']])
+        league_players.append(player)
+        page = templates['player_pages'][number % len(templates['player_pages'])]
+        routes[route(asset_data_url + '/' + player['id'])] = page + b'<!-- %d -->' % number
+
+    bootstrap = dict(templates['bootstrap'], elements=elements)
+    routes[route(fpl_url)] = json.dumps(bootstrap).encode()
+    routes[route(fpl_fixtures_url)] = json.dumps(templates['fixtures']).encode()
+    routes[route(league_url(fpl_league, fpl_season))] = understat_page(
+        dict(templates['league'], datesData=[], playersData=league_players)
+    )
+    return routes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record response fixtures for the pipeline benchmark')
+    parser.add_argument('command', choices=['record'])
+    parser.add_argument('--samples', type=int, default=40, help='element summaries and player pages to record')
+    args = parser.parse_args()
+    record(args.samples)
+
+
+if __name__ == '__main__':
+    main()
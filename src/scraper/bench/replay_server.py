@@ -0,0 +1,109 @@
+# ###################################################################################
+# local HTTP replay server for the pipeline benchmark
+# ###################################################################################
+# Serves a {route: body} mapping of recorded responses, where a route is the
+# original url's /<host><path>, so the scraper can be pointed at it with
+# SCRAPER_HTTP_UPSTREAM. Each response can be delayed by a configurable latency
+# with jitter, and a share of requests answered with an error status to exercise
+# the client's retries. Bodies carry an ETag and conditional requests are answered
+# with 304, as the real endpoints do.
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import threading
+import time
+
+
+class ReplayServer:
+    # latency and jitter in seconds, error_rate the share of requests answered with
+    # error_status
+    def __init__(self, routes, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, seed=0):
+        self.routes = routes
+        self.etags = {}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'not_modified': 0, 'errors': 0, 'not_found': 0, 'bytes': 0}
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    def _etag(self, path):
+        etag = self.etags.get(path)
+        if etag is None:
+            etag = self.etags[path] = '"' + hashlib.sha1(self.routes[path]).hexdigest() + '"'
+        return etag
+
+    def _count(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    # delay for this request, and whether to fail it
+    def _draw(self):
+        with self.lock:
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            fail = self.random.random() < self.error_rate
+        return delay, fail
+
+    def _handler(self):
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                replay._count('requests')
+                delay, fail = replay._draw()
+                if delay:
+                    time.sleep(delay)
+
+                if fail:
+                    replay._count('errors')
+                    self._reply(replay.error_status)
+                elif self.path not in replay.routes:
+                    replay._count('not_found')
+                    self._reply(404)
+                else:
+                    etag = replay._etag(self.path)
+                    if self.headers.get('If-None-Match') == etag:
+                        replay._count('not_modified')
+                        self._reply(304, headers={'ETag': etag})
+                    else:
+                        body = replay.routes[self.path]
+                        replay._count('bytes', len(body))
+                        self._reply(200, body, {'ETag': etag})
+
+            def _reply(self, status, body=b'', headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # snapshot of the request counters
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
@@ -0,0 +1,109 @@
+# ###################################################################################
+# checkpoint and resume for interrupted scrape runs
+# ###################################################################################
+# As each asset's outputs are written, its id and a hash of its output bundle are
+# appended to a checkpoint file. The first line records the run's plan (season,
+# gameweek, full or incremental), and the file is removed once the run completes.
+# A run started with resume picks up the checkpoint of an interrupted run with the
+# same plan, so assets it already finished, and whose stored outputs still match
+# the recorded hash, are not fetched and parsed again.
+import hashlib
+import json
+import logging
+import os
+
+CHECKPOINT_FILE = 'src/scraper/data/checkpoint.jsonl'
+
+# completed assets are flushed to the file straight away, and synced to disk every
+# this many assets
+SYNC_EVERY = int(os.environ.get('SCRAPER_CHECKPOINT_SYNC_EVERY', 25))
+
+
+def bundle_hash(bundle):
+    return hashlib.sha256(json.dumps(bundle, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+# completed assets recorded by a checkpoint with the given plan, as {asset id: entry}
+def load_checkpoint(plan, checkpoint_file=CHECKPOINT_FILE):
+    if not os.path.isfile(checkpoint_file):
+        return None
+
+    completed = {}
+    with open(checkpoint_file) as infile:
+        # without a readable plan line the checkpoint cannot be matched to this run
+        try:
+            header = json.loads(infile.readline())
+        except ValueError:
+            return None
+        if not isinstance(header, dict) or header.get('plan') != plan:
+            return None
+
+        for line in infile:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # a line torn by the interruption, the asset is simply redone
+                continue
+            completed[entry['asset']] = entry
+
+    return completed
+
+
+class Checkpoint:
+    def __init__(self, plan, resume=False, checkpoint_file=CHECKPOINT_FILE):
+        self.checkpoint_file = checkpoint_file
+        self.unsynced = 0
+
+        # assets completed by an interrupted run being resumed
+        self.completed = load_checkpoint(plan, checkpoint_file) if resume else None
+
+        if self.completed is not None:
+            logging.info(f'Resuming interrupted run with {len(self.completed)} assets already completed')
+            self.outfile = open(checkpoint_file, 'a')
+            # finish any line torn by the interruption before appending
+            if self.outfile.tell() > 0:
+                with open(checkpoint_file, 'rb') as infile:
+                    infile.seek(-1, os.SEEK_END)
+                    if infile.read(1) != b'\n':
+                        self.outfile.write('\n')
+        else:
+            self.completed = {}
+            self.outfile = open(checkpoint_file, 'w')
+            self.outfile.write(json.dumps({'plan': plan}) + '\n')
+        self.outfile.flush()
+
+    # record an asset as completed with its output bundle, and the datasets in it
+    # that were also written to db
+    def record(self, asset_id, bundle, db_datasets):
+        entry = {'asset': asset_id, 'hash': bundle_hash(bundle), 'datasets': sorted(bundle), 'db': sorted(db_datasets)}
+        self.outfile.write(json.dumps(entry) + '\n')
+        self.outfile.flush()
+        self.unsynced += 1
+        if self.unsynced >= SYNC_EVERY:
+            self.sync()
+
+    def sync(self):
+        self.outfile.flush()
+        os.fsync(self.outfile.fileno())
+        self.unsynced = 0
+
+    # completed assets whose stored outputs still match, given read(asset_id, name),
+    # as {asset id: (bundle, datasets written to db)}
+    def verified(self, read):
+        verified = {}
+        for asset_id, entry in self.completed.items():
+            bundle = {name: read(asset_id, name) for name in entry['datasets']}
+            if bundle_hash(bundle) == entry['hash']:
+                verified[asset_id] = (bundle, entry['db'])
+        return verified
+
+    # keep the checkpoint after a failed run, so the next run can resume from it
+    def close(self):
+        if not self.outfile.closed:
+            self.sync()
+            self.outfile.close()
+
+    # the run completed, nothing left to resume
+    def complete(self):
+        self.outfile.close()
+        os.remove(self.checkpoint_file)
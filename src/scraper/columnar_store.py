@@ -0,0 +1,225 @@
+# ###################################################################################
+# columnar shot and match store for the xG data scraper
+# ###################################################################################
+# Shots and matches from understat player pages are stored as typed Parquet files,
+# one per season, partitioned hive style:
+#   STORE_DIR/shots/season=2022/part-0.parquet
+#   STORE_DIR/matches/season=2022/part-0.parquet
+# so a scan only opens the seasons it needs and only reads the columns it asks
+# for, memory mapped. During a run each refreshed player's records are converted
+# to one table per dataset on a background thread, and at the end of the run each
+# season touched is rewritten once, with the refreshed players' rows replaced.
+# Needs pyarrow, the store is disabled without it or with SCRAPER_COLUMNAR=0.
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+STORE_DIR = 'src/scraper/data/columnar'
+
+ENABLED = pq is not None and os.environ.get('SCRAPER_COLUMNAR', '1') != '0'
+
+# typed columns kept for each dataset, season and player_id being the partition keys
+if pa is not None:
+    SHOT_SCHEMA = pa.schema([
+        ('id', pa.int64()),
+        ('match_id', pa.int64()),
+        ('date', pa.timestamp('s')),
+        ('minute', pa.int16()),
+        ('result', pa.string()),
+        ('situation', pa.string()),
+        ('shotType', pa.string()),
+        ('lastAction', pa.string()),
+        ('X', pa.float64()),
+        ('Y', pa.float64()),
+        ('x', pa.float64()),
+        ('y', pa.float64()),
+        ('xG', pa.float64()),
+        ('player', pa.string()),
+        ('player_assisted', pa.string()),
+        ('h_a', pa.string()),
+        ('h_team', pa.string()),
+        ('a_team', pa.string()),
+        ('h_goals', pa.int16()),
+        ('a_goals', pa.int16()),
+    ])
+
+    MATCH_SCHEMA = pa.schema([
+        ('id', pa.int64()),
+        ('roster_id', pa.int64()),
+        ('date', pa.timestamp('s')),
+        ('position', pa.string()),
+        ('time', pa.int16()),
+        ('goals', pa.int16()),
+        ('shots', pa.int16()),
+        ('assists', pa.int16()),
+        ('key_passes', pa.int16()),
+        ('npg', pa.int16()),
+        ('xG', pa.float64()),
+        ('xA', pa.float64()),
+        ('npxG', pa.float64()),
+        ('xGChain', pa.float64()),
+        ('xGBuildup', pa.float64()),
+        ('h_team', pa.string()),
+        ('a_team', pa.string()),
+        ('h_goals', pa.int16()),
+        ('a_goals', pa.int16()),
+    ])
+
+    # player page dataset stored for each kind
+    DATASETS = {'shots': ('shotdata', SHOT_SCHEMA), 'matches': ('matchesdata', MATCH_SCHEMA)}
+
+
+# convert a column of understat values, mostly numeric strings, to its arrow type
+def to_arrow(values, field):
+    if pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+        try:
+            values = values.astype(float)
+        except (TypeError, ValueError):
+            values = pd.to_numeric(values, errors='coerce')
+    elif pa.types.is_timestamp(field.type):
+        values = pd.to_datetime(values, errors='coerce')
+    return pa.array(values, type=field.type, from_pandas=True)
+
+
+# build a typed table from a list of understat records, missing fields left null
+def to_table(records, schema):
+    frame = pd.DataFrame.from_records(records)
+    columns = []
+    for field in schema:
+        values = frame[field.name] if field.name in frame else pd.Series(np.full(len(frame), None, dtype=object))
+        columns.append(to_arrow(values, field))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+# a player's records of one dataset as a single table with their player id, and
+# the season of each row
+def player_table(player_id, records, schema):
+    table = to_table(records, schema)
+    table = table.append_column('player_id', pa.array(np.full(len(records), int(player_id)), type=pa.int64()))
+    seasons = pd.to_numeric(pd.Series([record.get('season') for record in records], dtype=object), errors='coerce')
+    return table, seasons.to_numpy()
+
+
+def season_file(kind, season, root=STORE_DIR):
+    return os.path.join(root, kind, f'season={season}', 'part-0.parquet')
+
+
+class ColumnarWriter:
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.converter = ThreadPoolExecutor(max_workers=1)
+        # {kind: [(player table, row seasons) future]} converted this run
+        self.pending = {kind: [] for kind in DATASETS}
+        self.players = set()
+
+        # understat players with rows in the store, whose unchanged pages can be skipped
+        self.stored = set()
+        for kind in DATASETS:
+            if os.path.isdir(os.path.join(root, kind)):
+                self.stored.update(read(kind, ['player_id'], root=root).column('player_id').to_pylist())
+
+    def has(self, player_id):
+        return int(player_id) in self.stored
+
+    # queue a player's shots and matches, converted off the caller's thread
+    def add(self, player_id, datasets):
+        self.players.add(int(player_id))
+        for kind, (name, schema) in DATASETS.items():
+            records = datasets.get(name)
+            if records:
+                self.pending[kind].append(self.converter.submit(player_table, player_id, records, schema))
+
+    # rewrite each season touched, replacing the rows of the players added. Seasons
+    # stored with rows of those players are rewritten too, even where their new
+    # pages have no rows for the season, so no stale rows are left behind
+    def commit(self):
+        players = pa.array(sorted(self.players), type=pa.int64())
+        for kind, futures in self.pending.items():
+            converted = [future.result() for future in futures]
+            tables = dict.fromkeys(self._stored_seasons(kind, players))
+            if converted:
+                table = pa.concat_tables([table for table, _ in converted])
+                seasons = np.concatenate([row_seasons for _, row_seasons in converted])
+                for season in np.unique(seasons[~np.isnan(seasons)]).astype(int):
+                    tables[season] = table.filter(pa.array(seasons == season))
+            for season, table in tables.items():
+                self._write_season(kind, season, table, players)
+        self.stored.update(self.players)
+        self._reset()
+
+    # seasons of a kind whose file has rows of any of players
+    def _stored_seasons(self, kind, players):
+        kind_dir = os.path.join(self.root, kind)
+        if len(players) == 0 or not os.path.isdir(kind_dir):
+            return []
+        seasons = []
+        for name in sorted(os.listdir(kind_dir)):
+            path = os.path.join(kind_dir, name, 'part-0.parquet')
+            if name.startswith('season=') and os.path.isfile(path):
+                stored = pq.read_table(path, columns=['player_id'], memory_map=True).column('player_id')
+                if pc.any(pc.is_in(stored, value_set=players)).as_py():
+                    seasons.append(int(name[len('season='):]))
+        return seasons
+
+    # replace the season's rows of players with table, None if they have none
+    def _write_season(self, kind, season, table, players):
+        path = season_file(kind, season, self.root)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.isfile(path):
+            existing = pq.read_table(path, memory_map=True)
+            kept = existing.filter(pc.invert(pc.is_in(existing.column('player_id'), value_set=players)))
+            table = kept if table is None else pa.concat_tables([kept, table.cast(kept.schema)])
+        elif table is None:
+            return
+        # dot prefixed, so scans in progress skip the partly written file
+        temp_path = os.path.join(os.path.dirname(path), '.part-0.parquet.temp')
+        pq.write_table(table, temp_path, compression='zstd')
+        os.replace(temp_path, path)
+
+    def abort(self):
+        for futures in self.pending.values():
+            for future in futures:
+                future.cancel()
+        self._reset()
+
+    def _reset(self):
+        self.pending = {kind: [] for kind in DATASETS}
+        self.players = set()
+
+    def close(self):
+        self.converter.shutdown()
+
+
+# scan a dataset, reading only the given columns of the matching seasons and players
+def read(kind, columns=None, seasons=None, players=None, filters=None, root=STORE_DIR):
+    filters = list(filters or [])
+    if seasons is not None:
+        filters.append(('season', 'in', [int(season) for season in seasons]))
+    if players is not None:
+        filters.append(('player_id', 'in', [int(player) for player in players]))
+
+    return pq.read_table(
+        os.path.join(root, kind),
+        columns=columns,
+        filters=filters or None,
+        partitioning='hive',
+        memory_map=True,
+    )
+
+
+# shots table, e.g. read_shots(['x', 'y', 'xG'], seasons=['2022'], filters=[('result', '=', 'Goal')])
+def read_shots(columns=None, seasons=None, players=None, filters=None, root=STORE_DIR):
+    return read('shots', columns, seasons, players, filters, root)
+
+
+def read_matches(columns=None, seasons=None, players=None, filters=None, root=STORE_DIR):
+    return read('matches', columns, seasons, players, filters, root)
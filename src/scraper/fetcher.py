@@ -0,0 +1,62 @@
+# ###################################################################################
+# concurrent fetch stage for the xG data scraper
+# ###################################################################################
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
+import os
+
+from http_client import HttpClient
+from page_parser import PARSER_VERSION, extract_payloads
+from response_cache import ResponseCache
+from telemetry import stages
+
+# number of requests in flight at once, override with SCRAPER_WORKERS env variable
+DEFAULT_WORKERS = 16
+WORKERS = int(os.environ.get('SCRAPER_WORKERS', DEFAULT_WORKERS))
+
+# on-disk response cache, disable with SCRAPER_CACHE=0
+cache = ResponseCache() if os.environ.get('SCRAPER_CACHE', '1') != '0' else None
+
+# pooled, rate limited client shared by every fetch in the run
+client = HttpClient(cache=cache)
+
+
+# fetch a url and return the decoded JSON body
+def fetch_json(url, revalidate=False):
+    return client.get(url, revalidate=revalidate).json()
+
+
+# fetch a url and return the response, with its digest if served via the cache
+def fetch_response(url, revalidate=False):
+    return client.get(url, revalidate=revalidate)
+
+
+# fetch an understat page and return its named JSON payloads, reusing the
+# previous parse when the page body has not changed
+def fetch_payloads(url, names, revalidate=False):
+    res = client.get(url, revalidate=revalidate)
+    parse = stages.timed('payload_parse', extract_payloads)
+    if cache is None:
+        return parse(res.content, names)
+    return cache.memo(res.digest, f'payloads{PARSER_VERSION}', lambda: parse(res.content, names))
+
+
+# fetch every url in a {key: url} mapping using a bounded pool of worker threads,
+# returning a {key: result} mapping. Failed fetches are logged and stored as None
+# so a single bad asset does not abort the whole run.
+def fetch_all(urls, fetch, workers=WORKERS):
+    results = {}
+    if not urls:
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(fetch, url): key for key, url in urls.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception as err:
+                logging.error(f'Fetch failed for {urls[key]}: {err}')
+                results[key] = None
+
+    return results
@@ -0,0 +1,178 @@
+# ###################################################################################
+# batched Firestore writer with change detection
+# ###################################################################################
+# Document writes are buffered into Firestore batches (up to 500 operations, or
+# the request size limit) which are committed concurrently. Each document's
+# content hash is remembered once its batch commits, so documents that have not
+# changed since the last run are skipped entirely.
+#
+# The sink only needs `db.batch()` and `db.collection(name).document(id)`, so it
+# works the same against production, the Firestore emulator (set
+# FIRESTORE_EMULATOR_HOST before creating the client) or MemoryFirestore below.
+from concurrent.futures import ThreadPoolExecutor, wait
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from telemetry import stages
+
+# last committed content hash of every document, keyed by "collection/document"
+HASHES_FILE = 'src/scraper/data/firestore_hashes.json'
+
+# Firestore limits a batch to 500 writes and a request to 10MiB
+MAX_BATCH_OPS = 500
+MAX_BATCH_BYTES = 9 * 1024 * 1024
+
+# number of batches committed at once
+COMMIT_WORKERS = int(os.environ.get('SCRAPER_FIRESTORE_WORKERS', 4))
+
+
+# stable hash and serialised size of a document's content
+def content_hash(data):
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str).encode('utf8')
+    return hashlib.sha256(encoded).hexdigest(), len(encoded)
+
+
+class FirestoreSink:
+    def __init__(self, db, hashes_file=HASHES_FILE, workers=COMMIT_WORKERS):
+        self.db = db
+        self.hashes_file = hashes_file
+        self.hashes = {}
+        if hashes_file and os.path.isfile(hashes_file):
+            with open(hashes_file) as infile:
+                self.hashes = json.load(infile)
+
+        self.pending = []
+        self.pending_bytes = 0
+        self.futures = []
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.lock = threading.Lock()
+        self.counters = {'written': 0, 'skipped': 0, 'batches': 0, 'failed': 0}
+
+    # queue a document write, skipping it if unchanged since it was last committed
+    def set(self, collection, document, data):
+        key = collection + '/' + document
+        digest, size = content_hash(data)
+        with self.lock:
+            if self.hashes.get(key) == digest:
+                self.counters['skipped'] += 1
+                return
+
+        if self.pending and (len(self.pending) >= MAX_BATCH_OPS or self.pending_bytes + size > MAX_BATCH_BYTES):
+            self._submit()
+        self.pending.append((collection, document, data, digest))
+        self.pending_bytes += size
+
+    # hand the pending writes to the commit pool as one batch
+    def _submit(self):
+        writes, self.pending, self.pending_bytes = self.pending, [], 0
+        self.futures.append(self.executor.submit(self._commit, writes))
+
+    def _commit(self, writes):
+        batch = self.db.batch()
+        for collection, document, data, _ in writes:
+            batch.set(self.db.collection(collection).document(document), data)
+
+        try:
+            with stages.stage('firestore_commit'):
+                batch.commit()
+        except Exception as err:
+            logging.error(f'Firestore batch of {len(writes)} writes failed: {err}')
+            with self.lock:
+                self.counters['failed'] += len(writes)
+            raise
+
+        with self.lock:
+            for collection, document, _, digest in writes:
+                self.hashes[collection + '/' + document] = digest
+            self.counters['written'] += len(writes)
+            self.counters['batches'] += 1
+
+    # commit everything queued so far and persist the committed hashes. Raises the
+    # first commit error, after all other batches have finished.
+    def flush(self):
+        if self.pending:
+            self._submit()
+        futures, self.futures = self.futures, []
+        wait(futures)
+        self._save_hashes()
+        for future in futures:
+            if future.exception() is not None:
+                raise future.exception()
+
+    def _save_hashes(self):
+        if not self.hashes_file:
+            return
+        with self.lock:
+            hashes = dict(self.hashes)
+        temp_file = self.hashes_file + '.temp'
+        with open(temp_file, 'w') as outfile:
+            json.dump(hashes, outfile)
+        os.replace(temp_file, self.hashes_file)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.executor.shutdown()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+# ###################################################################################
+# in-memory stand-in for the Firestore client, for tests and offline runs
+# ###################################################################################
+class MemoryFirestore:
+    def __init__(self):
+        self.documents = {}
+        self.commits = 0
+        self.lock = threading.Lock()
+
+    def collection(self, name):
+        return _MemoryCollection(self, name)
+
+    def batch(self):
+        return _MemoryBatch(self)
+
+
+class _MemoryCollection:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def document(self, document):
+        return _MemoryDocument(self.db, self.name + '/' + document)
+
+
+class _MemoryDocument:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def set(self, data):
+        with self.db.lock:
+            self.db.documents[self.path] = copy.deepcopy(data)
+
+    def get(self):
+        with self.db.lock:
+            return copy.deepcopy(self.db.documents.get(self.path))
+
+
+class _MemoryBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, reference, data):
+        self.writes.append((reference, copy.deepcopy(data)))
+
+    def commit(self):
+        with self.db.lock:
+            for reference, data in self.writes:
+                self.db.documents[reference.path] = data
+            self.db.commits += 1
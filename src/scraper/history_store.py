@@ -0,0 +1,243 @@
+# ###################################################################################
+# append-only metric history for the xG data scraper
+# ###################################################################################
+# Every run's asset and team metrics are appended to a per-season history, so
+# trends over the season can be read back although each run overwrites its
+# outputs. A run is stored as a frame holding only the fields that changed since
+# the previous run, with a full keyframe every KEYFRAME_EVERY runs, each frame
+# zlib compressed and appended to frames.bin. index.jsonl records each frame's run
+# timestamp, gameweek and byte range, so reading a player's series is a seek to
+# the last keyframe before the range and a replay of the frames in it:
+#   HISTORY_DIR/<season>/frames.bin
+#   HISTORY_DIR/<season>/index.jsonl
+# Disable with SCRAPER_HISTORY=0. To print a series from the project root:
+#   python3 src/scraper/history_store.py 2022 assets 233 xG90 npxG90 [--gameweeks 5 6]
+import argparse
+from bisect import bisect_left, bisect_right
+import json
+import os
+import zlib
+
+HISTORY_DIR = 'src/scraper/data/history'
+
+ENABLED = os.environ.get('SCRAPER_HISTORY', '1') != '0'
+
+# runs between full keyframes, bounding how many frames a read has to replay
+KEYFRAME_EVERY = int(os.environ.get('SCRAPER_HISTORY_KEYFRAME_EVERY', 24))
+
+# fields kept for each kind of record, and the field each is keyed by
+ASSET_FIELDS = [
+    'web_name', 'team', 'element_type', 'now_cost', 'minutes', 'total_points', 'goals_scored', 'assists',
+    'form', 'selected_by_percent', 'games', 'key_passes', 'npg', 'npxG', 'shots', 'xA', 'xG', 'xGBuildup',
+    'xGChain', 'xG_diff', 'npxG_diff', 'xA_diff', 'xG90', 'npxG90', 'xA90', 'npg_minutes', 'goals90',
+    'goals_minutes', 'npg90', 'shots90', 'kp90', 'GA', 'xGA', 'xGA90', 'xGA_diff',
+]
+TEAM_FIELDS = [
+    'id', 'matches', 'wins', 'draws', 'loses', 'scored', 'missed', 'pts', 'xG', 'npxG', 'xGA', 'npxGA',
+    'npxGD', 'ppda_coef', 'oppda_coef', 'deep', 'deep_allowed', 'xpts', 'xpts_diff', 'xG_diff', 'xGA_diff',
+    'xG90', 'xGA90',
+]
+KINDS = {'assets': ('id', ASSET_FIELDS), 'teams': ('title', TEAM_FIELDS)}
+
+
+# {key: {field: value}} of the kept fields of each record
+def project(records, kind):
+    key_field, fields = KINDS[kind]
+    return {
+        str(record[key_field]): {field: record[field] for field in fields if field in record}
+        for record in records if record and record.get(key_field) is not None
+    }
+
+
+# changed and added records of current against previous, each with only its
+# changed fields, fields no longer present set to None, and the removed keys
+def delta(previous, current):
+    changes = {}
+    for key, record in current.items():
+        old = previous.get(key)
+        if old is None:
+            changes[key] = record
+            continue
+        changed = {field: value for field, value in record.items() if old.get(field) != value}
+        changed.update({field: None for field in old.keys() - record.keys()})
+        if changed:
+            changes[key] = changed
+    return changes, sorted(previous.keys() - current.keys())
+
+
+def apply_delta(records, changes, removed):
+    for key in removed:
+        records.pop(key, None)
+    for key, changed in changes.items():
+        records[key] = dict(records.get(key, {}), **changed)
+
+
+def encode_frame(frame):
+    return zlib.compress(json.dumps(frame, separators=(',', ':')).encode(), 6)
+
+
+class HistoryStore:
+    def __init__(self, root=HISTORY_DIR):
+        self.root = root
+        # {season: [index entry]}, in run order
+        self.indexes = {}
+        # {season: {kind: {key: record}}} as of each season's last frame
+        self.states = {}
+
+    def _path(self, season, name):
+        return os.path.join(self.root, str(season), name)
+
+    def index(self, season):
+        if season not in self.indexes:
+            entries = []
+            path = self._path(season, 'index.jsonl')
+            if os.path.isfile(path):
+                with open(path) as infile:
+                    for line in infile:
+                        try:
+                            entries.append(json.loads(line))
+                        except ValueError:
+                            # a line torn by an interrupted append, its frame is ignored
+                            continue
+            self.indexes[season] = entries
+        return self.indexes[season]
+
+    def _read_frame(self, infile, entry):
+        infile.seek(entry['offset'])
+        return json.loads(zlib.decompress(infile.read(entry['length'])))
+
+    # position of the last keyframe at or before position
+    def _keyframe_before(self, index, position):
+        while position > 0 and not index[position]['keyframe']:
+            position -= 1
+        return position
+
+    # the records as of the season's last frame, replayed from its last keyframe
+    def state(self, season):
+        if season not in self.states:
+            index = self.index(season)
+            state = None
+            if index:
+                last = len(index) - 1
+                with open(self._path(season, 'frames.bin'), 'rb') as infile:
+                    for entry in index[self._keyframe_before(index, last):]:
+                        frame = self._read_frame(infile, entry)
+                        if frame['keyframe']:
+                            state = {kind: frame[kind] for kind in KINDS}
+                        else:
+                            for kind in KINDS:
+                                apply_delta(state[kind], frame[kind], frame['removed'][kind])
+            self.states[season] = state
+        return self.states[season]
+
+    # append a run's assets and teams to the season's history, as a delta against
+    # the previous run or, every KEYFRAME_EVERY runs, a keyframe. run is the run's
+    # ISO start time, so runs sort by it
+    def append(self, run, gameweek, season, assets, teams):
+        index = self.index(season)
+        previous = self.state(season)
+        current = {'assets': project(assets, 'assets'), 'teams': project(teams, 'teams')}
+
+        since_keyframe = len(index) - self._keyframe_before(index, len(index) - 1) if index else 0
+        keyframe = previous is None or since_keyframe >= KEYFRAME_EVERY
+        frame = {'keyframe': keyframe}
+        if keyframe:
+            frame.update(current)
+        else:
+            frame['removed'] = {}
+            for kind in KINDS:
+                frame[kind], frame['removed'][kind] = delta(previous[kind], current[kind])
+
+        os.makedirs(os.path.join(self.root, str(season)), exist_ok=True)
+        data = encode_frame(frame)
+        with open(self._path(season, 'frames.bin'), 'ab') as outfile:
+            offset = outfile.tell()
+            outfile.write(data)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+
+        # the frame only counts once its index line is written
+        entry = {
+            'run': run, 'gameweek': gameweek, 'keyframe': keyframe, 'offset': offset, 'length': len(data),
+            'changed': {kind: len(frame[kind]) for kind in KINDS},
+        }
+        index_file = self._path(season, 'index.jsonl')
+        line = json.dumps(entry) + '\n'
+        # start a fresh line after any line torn by an interrupted append
+        if os.path.isfile(index_file) and os.path.getsize(index_file) > 0:
+            with open(index_file, 'rb') as infile:
+                infile.seek(-1, os.SEEK_END)
+                if infile.read(1) != b'\n':
+                    line = '\n' + line
+        with open(index_file, 'a') as outfile:
+            outfile.write(line)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+
+        index.append(entry)
+        self.states[season] = current
+        return entry
+
+    # positions of the season's runs from start to end (ISO timestamps, inclusive)
+    # and in gameweeks, if given
+    def select(self, season, start=None, end=None, gameweeks=None):
+        index = self.index(season)
+        runs = [entry['run'] for entry in index]
+        first = bisect_left(runs, start) if start is not None else 0
+        last = bisect_right(runs, end) if end is not None else len(runs)
+        positions = range(first, last)
+        if gameweeks is not None:
+            gameweeks = set(gameweeks)
+            positions = [position for position in positions if index[position]['gameweek'] in gameweeks]
+        return list(positions)
+
+    # one record's fields at each selected run, e.g. an asset's xG90 over the
+    # season, as [{'run': ..., 'gameweek': ..., field: value, ...}]. Runs where
+    # the record did not exist are left out
+    def series(self, season, kind, key, fields=None, start=None, end=None, gameweeks=None):
+        index = self.index(season)
+        positions = self.select(season, start, end, gameweeks)
+        if not positions:
+            return []
+
+        key = str(key)
+        selected = set(positions)
+        record = None
+        series = []
+        with open(self._path(season, 'frames.bin'), 'rb') as infile:
+            for position in range(self._keyframe_before(index, positions[0]), positions[-1] + 1):
+                entry = index[position]
+                frame = self._read_frame(infile, entry)
+                if frame['keyframe']:
+                    record = frame[kind].get(key)
+                elif key in frame['removed'][kind]:
+                    record = None
+                elif key in frame[kind]:
+                    record = dict(record or {}, **frame[kind][key])
+
+                if position in selected and record is not None:
+                    values = record if fields is None else {field: record.get(field) for field in fields}
+                    series.append(dict(values, run=entry['run'], gameweek=entry['gameweek']))
+        return series
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the history of an asset or team')
+    parser.add_argument('season')
+    parser.add_argument('kind', choices=sorted(KINDS))
+    parser.add_argument('key', help='asset id or team title')
+    parser.add_argument('fields', nargs='*', help='fields to print, all if none are given')
+    parser.add_argument('--start', help='first run, as an ISO timestamp')
+    parser.add_argument('--end', help='last run, as an ISO timestamp')
+    parser.add_argument('--gameweeks', type=int, nargs='+')
+    args = parser.parse_args()
+
+    store = HistoryStore()
+    for point in store.series(
+        args.season, args.kind, args.key, args.fields or None, args.start, args.end, args.gameweeks
+    ):
+        print(json.dumps(point))
+
+
+if __name__ == '__main__':
+    main()
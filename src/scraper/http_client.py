@@ -0,0 +1,193 @@
+# ###################################################################################
+# shared HTTP client layer for the xG data scraper
+# ###################################################################################
+# Every request made by the scraper goes through a single HttpClient, which keeps
+# one pooled keep-alive session per host, rate limits each host with a token
+# bucket, applies a timeout to every request and retries 429/5xx responses and
+# connection errors with jittered exponential backoff. When given a ResponseCache,
+# fresh responses are served from disk and stale ones are revalidated.
+import logging
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError, HTTPError, Timeout
+
+# request timeout in seconds, as (connect, read)
+DEFAULT_TIMEOUT = (5, float(os.environ.get('SCRAPER_HTTP_TIMEOUT', 30)))
+
+# maximum number of retries for a single request
+DEFAULT_RETRIES = int(os.environ.get('SCRAPER_HTTP_RETRIES', 5))
+
+# backoff base and cap (seconds) for retries
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+
+# connections kept alive per host, should be at least the fetch worker count
+POOL_SIZE = int(os.environ.get('SCRAPER_HTTP_POOL_SIZE', 32))
+
+# per host rate limits as (requests per second, burst size)
+HOST_RATE_LIMITS = {
+    'fantasy.premierleague.com': (20, 40),
+    'understat.com': (8, 16),
+}
+DEFAULT_RATE_LIMIT = (10, 20)
+
+# status codes worth retrying
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# send every request to this server instead, as <upstream>/<host><path>, e.g. the
+# benchmark replay server. Set with SCRAPER_HTTP_UPSTREAM. Rate limits and the
+# response cache still apply per original url.
+UPSTREAM = os.environ.get('SCRAPER_HTTP_UPSTREAM')
+
+
+# ###################################################################################
+# token bucket rate limiter, shared between all threads fetching from one host.
+# The rate adapts: it is halved each time the host throttles us (429) and creeps
+# back up towards the configured rate on each successful response.
+# ###################################################################################
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.max_rate = float(rate)
+        self.min_rate = self.max_rate / 16
+        self.rate = self.max_rate
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # block until a token is available, then take it
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    # host is throttling us, back off multiplicatively
+    def throttle(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+
+    # request succeeded, recover additively towards the configured rate
+    def recover(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+
+class HttpClient:
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 rate_limits=HOST_RATE_LIMITS, pool_size=POOL_SIZE, cache=None, upstream=UPSTREAM):
+        self.cache = cache
+        self.upstream = upstream.rstrip('/') if upstream else None
+        self.timeout = timeout
+        self.retries = retries
+        self.rate_limits = rate_limits
+        self.pool_size = pool_size
+        self.sessions = {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'retries': 0, 'errors': 0, 'throttled': 0, 'bytes': 0}
+
+    # get (or lazily create) the pooled session and rate limiter for a host
+    def _host(self, host):
+        with self.lock:
+            if host not in self.sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.sessions[host] = session
+                self.buckets[host] = TokenBucket(*self.rate_limits.get(host, DEFAULT_RATE_LIMIT))
+            return self.sessions[host], self.buckets[host]
+
+    def _count(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    # seconds to wait before retry number `attempt`, honouring Retry-After if sent
+    def _backoff(self, attempt, res=None):
+        if res is not None and res.headers.get('Retry-After', '').isdigit():
+            return min(BACKOFF_MAX, int(res.headers['Retry-After']))
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    # GET a url, via the response cache if there is one. Pass revalidate=True to
+    # ignore the endpoint TTL and check with the server before serving a cached body.
+    def get(self, url, headers=None, revalidate=False):
+        if self.cache is None:
+            return self._request(url, headers)
+
+        entry = self.cache.lookup(url)
+        if entry is not None:
+            if not revalidate and self.cache.is_fresh(url, entry):
+                return self.cache.serve(url, entry)
+            headers = {**(headers or {}), **self.cache.conditional_headers(entry)}
+
+        res = self._request(url, headers)
+        if res.status_code == 304 and entry is not None:
+            return self.cache.serve(url, entry, revalidated=True)
+        return self.cache.store(url, res)
+
+    # GET a url from the network, retrying transient failures. Returns the response,
+    # or raises HTTPError / ConnectionError / Timeout once the retries are exhausted.
+    def _request(self, url, headers=None):
+        parts = urlsplit(url)
+        session, bucket = self._host(parts.hostname)
+        target = url
+        if self.upstream is not None:
+            target = self.upstream + '/' + parts.netloc + parts.path + ('?' + parts.query if parts.query else '')
+
+        for attempt in range(self.retries + 1):
+            bucket.acquire()
+            self._count('requests')
+            try:
+                res = session.get(target, headers=headers, timeout=self.timeout)
+            except (RequestsConnectionError, Timeout) as err:
+                if attempt == self.retries:
+                    self._count('errors')
+                    raise
+                logging.warning(f'Request to {url} failed ({err}), retrying')
+                self._count('retries')
+                time.sleep(self._backoff(attempt))
+                continue
+
+            self._count('bytes', len(res.content))
+            if res.status_code in RETRY_STATUS_CODES and attempt < self.retries:
+                if res.status_code == 429:
+                    self._count('throttled')
+                    bucket.throttle()
+                logging.warning(f'Request to {url} returned {res.status_code}, retrying')
+                self._count('retries')
+                time.sleep(self._backoff(attempt, res))
+                continue
+
+            try:
+                res.raise_for_status()
+            except HTTPError:
+                self._count('errors')
+                raise
+            bucket.recover()
+            return res
+
+    # snapshot of the request counters
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+            self.buckets = {}
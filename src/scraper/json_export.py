@@ -0,0 +1,80 @@
+# ###################################################################################
+# streaming JSON exports for the xG data scraper
+# ###################################################################################
+# The assets and teams exports are written record by record as each one is ready,
+# rather than serialized in one go at the end of the run. The records themselves
+# are still kept by the pipeline for the Firestore documents and read service, so
+# this saves the serialized copy of each document, not the records. Export
+# format, set with
+# SCRAPER_EXPORT_FORMAT:
+#   pretty  {"assets": [...]} indented as before, byte for byte (default)
+#   array   the same document with compact encoding
+#   jsonl   one compact record per line, in a .jsonl file alongside
+# Compact encoding uses orjson when it is installed. Exports are written to a temp
+# file and only moved into place once complete.
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+EXPORT_FORMAT = os.environ.get('SCRAPER_EXPORT_FORMAT', 'pretty')
+
+# indent of a record inside a pretty {"key": [...]} document
+PRETTY_RECORD_INDENT = ' ' * 8
+
+
+def encode(record, export_format):
+    if export_format == 'pretty':
+        return json.dumps(record, indent=4, sort_keys=True).replace('\n', '\n' + PRETTY_RECORD_INDENT).encode()
+    if orjson is not None:
+        return orjson.dumps(record)
+    return json.dumps(record, separators=(',', ':')).encode()
+
+
+class JsonExport:
+    def __init__(self, path, key, export_format=EXPORT_FORMAT):
+        if export_format not in ('pretty', 'array', 'jsonl'):
+            raise ValueError(f'Unknown export format {export_format}')
+        if export_format == 'jsonl':
+            path = os.path.splitext(path)[0] + '.jsonl'
+
+        self.path = path
+        self.temp_path = path + '.temp'
+        self.key = key
+        self.export_format = export_format
+        self.count = 0
+        self.outfile = open(self.temp_path, 'wb')
+
+    def write(self, record):
+        data = encode(record, self.export_format)
+        if self.export_format == 'jsonl':
+            self.outfile.write(data + b'\n')
+        elif self.export_format == 'pretty':
+            if self.count == 0:
+                self.outfile.write(b'{\n    "' + self.key.encode() + b'": [\n' + PRETTY_RECORD_INDENT.encode())
+            else:
+                self.outfile.write(b',\n' + PRETTY_RECORD_INDENT.encode())
+            self.outfile.write(data)
+        else:
+            self.outfile.write((b'{"' + self.key.encode() + b'":[' if self.count == 0 else b',') + data)
+        self.count += 1
+
+    # finish the document and move it into place
+    def close(self):
+        if self.export_format == 'pretty':
+            if self.count == 0:
+                self.outfile.write(b'{\n    "' + self.key.encode() + b'": []\n}')
+            else:
+                self.outfile.write(b'\n    ]\n}')
+        elif self.export_format == 'array':
+            self.outfile.write(b'{"' + self.key.encode() + b'":[]}' if self.count == 0 else b']}')
+        self.outfile.close()
+        os.replace(self.temp_path, self.path)
+
+    # drop a partly written export
+    def abort(self):
+        self.outfile.close()
+        os.remove(self.temp_path)
@@ -0,0 +1,120 @@
+# ###################################################################################
+# precomputed leaderboards for the xG data scraper
+# ###################################################################################
+# Ranks assets by each metric within every position and price band, and teams by
+# each team stat, so clients read a small ranked document ("top 20 midfielders by
+# npxG90") rather than every asset. Each group is ranked for all of its metrics at
+# once, by one argsort over a (assets x metrics) column table. Boards are keyed
+# <metric>_<position>_<price band>, e.g. npxG90_MID_all or xG90_ALL_5to7, and
+# team boards team_<metric>. The 'index' board lists the rest.
+import os
+
+import numpy as np
+import pandas as pd
+
+# asset metrics ranked, and team stats ranked
+ASSET_METRICS = [
+    'xG', 'npxG', 'xA', 'xGChain', 'xGBuildup', 'shots', 'key_passes', 'npg',
+    'xG90', 'npxG90', 'xA90', 'shots90', 'kp90', 'goals90', 'npg90',
+    'xG_diff', 'npxG_diff', 'xA_diff', 'xGA90', 'xGA_diff',
+]
+TEAM_METRICS = [
+    'xG', 'xGA', 'npxG', 'npxGA', 'npxGD', 'xG90', 'xGA90', 'xG_diff', 'xGA_diff',
+    'xpts', 'xpts_diff', 'deep', 'deep_allowed', 'ppda_coef', 'oppda_coef',
+]
+
+# metrics where lower ranks first, the rest rank highest first
+ASCENDING_METRICS = {'xGA', 'xGA90', 'npxGA', 'deep_allowed', 'ppda_coef'}
+
+# fpl element types, and price bands in tenths of a million as [low, high)
+POSITIONS = {1: 'GKP', 2: 'DEF', 3: 'MID', 4: 'FWD'}
+PRICE_BANDS = {'under5': (0, 50), '5to7': (50, 70), '7to9': (70, 90), '9plus': (90, None)}
+
+# entries per board, and minutes an asset must have played to be ranked
+BOARD_SIZE = int(os.environ.get('SCRAPER_LEADERBOARD_SIZE', 20))
+MIN_MINUTES = int(os.environ.get('SCRAPER_LEADERBOARD_MIN_MINUTES', 90))
+
+# asset and team fields carried on each board entry
+ASSET_ENTRY_FIELDS = ['id', 'web_name', 'team', 'element_type', 'now_cost', 'minutes']
+TEAM_ENTRY_FIELDS = ['id', 'title', 'short_name']
+
+
+# (records x fields) float table, NaN where a field is missing or not a number.
+# Understat fields copied onto assets are numeric strings, so values are parsed
+def column_table(records, fields):
+    frame = pd.DataFrame.from_records(list(records), columns=fields)
+    return frame.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+
+# rank the rows of table in every metric column at once, returning
+# {metric: [(row, value), ...]} with at most size rows each and NaNs left out
+def rank_columns(table, metrics, size):
+    signs = np.array([1.0 if metric in ASCENDING_METRICS else -1.0 for metric in metrics])
+    # NaNs sort last, so only the first finite entries of each column are kept
+    order = np.argsort(table * signs, axis=0, kind='stable')[:size]
+    ranked = {}
+    for column, metric in enumerate(metrics):
+        rows = order[:, column]
+        values = table[rows, column]
+        finite = np.isfinite(values)
+        ranked[metric] = list(zip(rows[finite].tolist(), values[finite].tolist()))
+    return ranked
+
+
+def board(metric, entries, **group):
+    return dict(
+        group, metric=metric, order='ascending' if metric in ASCENDING_METRICS else 'descending',
+        entries=entries,
+    )
+
+
+# boards for every asset metric in every position and price band, counting 'ALL'
+# positions and 'all' prices as a group of their own
+def build_asset_boards(fpl_asset_data, size=BOARD_SIZE, min_minutes=MIN_MINUTES):
+    table = column_table(fpl_asset_data, ASSET_METRICS + ['element_type', 'now_cost', 'minutes'])
+    values = table[:, :len(ASSET_METRICS)]
+    positions, costs, minutes = table[:, -3], table[:, -2], table[:, -1]
+    ranked = minutes >= min_minutes
+
+    position_masks = {'ALL': np.ones(len(table), dtype=bool)}
+    position_masks.update({name: positions == element_type for element_type, name in POSITIONS.items()})
+    band_masks = {'all': np.ones(len(table), dtype=bool)}
+    for band, (low, high) in PRICE_BANDS.items():
+        band_masks[band] = (costs >= low) & (costs < high if high is not None else True)
+
+    boards = {}
+    for position, position_mask in position_masks.items():
+        for band, band_mask in band_masks.items():
+            rows = np.flatnonzero(ranked & position_mask & band_mask)
+            for metric, entries in rank_columns(values[rows], ASSET_METRICS, size).items():
+                boards[f'{metric}_{position}_{band}'] = board(metric, [
+                    dict({field: fpl_asset_data[rows[row]].get(field) for field in ASSET_ENTRY_FIELDS}, value=value)
+                    for row, value in entries
+                ], position=position, price_band=band)
+    return boards
+
+
+def build_team_boards(team_data):
+    team_data = [team for team in team_data if team]
+    boards = {}
+    for metric, entries in rank_columns(column_table(team_data, TEAM_METRICS), TEAM_METRICS, len(team_data)).items():
+        boards[f'team_{metric}'] = board(metric, [
+            dict({field: team_data[row].get(field) for field in TEAM_ENTRY_FIELDS}, value=value)
+            for row, value in entries
+        ])
+    return boards
+
+
+# every board, keyed by document id, plus the index of them
+def build_leaderboards(fpl_asset_data, team_data):
+    boards = build_asset_boards(fpl_asset_data)
+    boards.update(build_team_boards(team_data))
+    boards['index'] = {
+        'asset_metrics': ASSET_METRICS,
+        'team_metrics': TEAM_METRICS,
+        'positions': ['ALL'] + list(POSITIONS.values()),
+        'price_bands': {'all': [None, None], **{band: list(limits) for band, limits in PRICE_BANDS.items()}},
+        'size': BOARD_SIZE,
+        'min_minutes': MIN_MINUTES,
+    }
+    return boards
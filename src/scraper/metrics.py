@@ -0,0 +1,129 @@
+# ###################################################################################
+# vectorized derived metrics for the xG data scraper
+# ###################################################################################
+# Derived metrics are computed over whole columns at once rather than per row, so
+# the cost of adding a metric does not grow with per-asset Python overhead.
+# Ratios that are undefined (zero minutes, zero goals) come out as NaN and are
+# reported as 0, as the scraper always has.
+import math
+
+import numpy as np
+import pandas as pd
+
+# understat fields copied as they are onto each matched fpl asset
+XG_ASSET_FIELDS = ['games', 'key_passes', 'position', 'npg', 'npxG', 'shots', 'xA', 'xG', 'xGBuildup', 'xGChain']
+
+# metrics derived for each matched fpl asset
+DERIVED_METRICS = [
+    'xG_diff', 'npxG_diff', 'xA_diff',
+    'shots90', 'goals90', 'npg90', 'kp90', 'xG90', 'npxG90', 'xA90',
+    'goals_minutes', 'npg_minutes',
+]
+
+
+# element-wise numerator / denominator, NaN wherever the denominator is zero or
+# the optional valid mask is false
+def safe_divide(numerator, denominator, valid=None):
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    where = denominator != 0
+    if valid is not None:
+        where &= valid
+    return np.divide(numerator, denominator, out=np.full(numerator.shape, np.nan), where=where)
+
+
+# build the merged fpl + understat table for matched assets and derive every metric
+# in one pass, returning {fpl asset id: {field: value}} for the matched assets
+def derive_asset_metrics(fpl_asset_data, assets, asset_xg_matches):
+    matched = [fpl_asset for fpl_asset in fpl_asset_data if asset_xg_matches[fpl_asset['id']] is not None]
+    if not matched:
+        return {}
+
+    xg_codes = [asset_xg_matches[fpl_asset['id']] for fpl_asset in matched]
+    table = pd.DataFrame.from_records(
+        [assets[asset] for asset in xg_codes],
+        columns=XG_ASSET_FIELDS + ['goals']
+    )
+    fpl = pd.DataFrame.from_records(matched, columns=['id', 'goals_scored', 'assists', 'minutes'])
+
+    xg = table[['npg', 'npxG', 'shots', 'xA', 'xG', 'key_passes', 'goals']].astype(float)
+    minutes = fpl['minutes'].astype(int).to_numpy()
+    played = minutes != 0
+    nineties = minutes / 90
+
+    derived = {
+        'xG_diff': fpl['goals_scored'].to_numpy() - xg['xG'].to_numpy(),
+        'npxG_diff': xg['npg'].to_numpy() - xg['npxG'].to_numpy(),
+        'xA_diff': fpl['assists'].to_numpy() - xg['xA'].to_numpy(),
+        'shots90': safe_divide(xg['shots'], nineties),
+        'goals90': safe_divide(xg['goals'], nineties),
+        'npg90': safe_divide(xg['npg'], nineties),
+        'kp90': safe_divide(xg['key_passes'], nineties),
+        'xG90': safe_divide(xg['xG'], nineties),
+        'npxG90': safe_divide(xg['npxG'], nineties),
+        'xA90': safe_divide(xg['xA'], nineties),
+        'goals_minutes': safe_divide(minutes, xg['goals'], valid=played),
+        'npg_minutes': safe_divide(minutes, xg['npg'], valid=played),
+    }
+
+    # project back to per-asset records, undefined ratios reported as 0
+    columns = {field: table[field].tolist() for field in XG_ASSET_FIELDS}
+    columns.update({metric: derived[metric].tolist() for metric in DERIVED_METRICS})
+
+    metrics = {}
+    for row, asset_id in enumerate(fpl['id'].tolist()):
+        record = {'xg_code': xg_codes[row]}
+        for field, values in columns.items():
+            value = values[row]
+            record[field] = 0 if isinstance(value, float) and math.isnan(value) else value
+        metrics[asset_id] = record
+
+    return metrics
+
+
+# team history columns summed, and averaged, over a season
+TEAM_SUM_COLUMNS = ['xG', 'xGA', 'npxG', 'npxGA', 'deep', 'deep_allowed', 'scored', 'missed', 'xpts', 'wins', 'draws', 'loses', 'pts', 'npxGD']
+TEAM_MEAN_COLUMNS = ['ppda_coef', 'oppda_coef']
+
+
+# att/def ratio of each {'att': ..., 'def': ...} ppda record, 0 where def is 0
+def ppda_ratio(ppda):
+    att = np.fromiter((record['att'] for record in ppda), dtype=float, count=len(ppda))
+    defence = np.fromiter((record['def'] for record in ppda), dtype=float, count=len(ppda))
+    return np.nan_to_num(safe_divide(att, defence), nan=0.0)
+
+
+# aggregate the match history of every team in a league season with one grouped
+# reduction, returning one row per team in teams data order. A season with no
+# history yet gives each team a single row of zeros.
+def aggregate_team_stats(team_json_data):
+    titles = [team['title'] for team in team_json_data.values()]
+    histories = [team['history'] for team in team_json_data.values()]
+
+    if histories and histories[-1]:
+        table = pd.DataFrame.from_records(
+            [row for history in histories for row in history],
+            columns=TEAM_SUM_COLUMNS + ['ppda', 'ppda_allowed']
+        )
+        table['ppda_coef'] = ppda_ratio(table['ppda'].tolist())
+        table['oppda_coef'] = ppda_ratio(table['ppda_allowed'].tolist())
+        table['team'] = np.repeat(titles, [len(history) for history in histories])
+    else:
+        table = pd.DataFrame(0, index=range(len(titles)), columns=TEAM_SUM_COLUMNS + TEAM_MEAN_COLUMNS)
+        table['team'] = titles
+
+    grouped = table.groupby('team', sort=False)
+    full_stat = grouped[TEAM_SUM_COLUMNS].sum().astype(float).reindex(titles, fill_value=0.0)
+    full_stat = full_stat.join(grouped[TEAM_MEAN_COLUMNS].mean().reindex(titles))
+    full_stat['matches'] = grouped.size().reindex(titles, fill_value=0)
+    full_stat.index.name = 'team'
+    full_stat.reset_index(inplace=True)
+
+    full_stat['xG_diff'] = full_stat['xG'] - full_stat['scored']
+    full_stat['xGA_diff'] = full_stat['xGA'] - full_stat['missed']
+    full_stat['xpts_diff'] = full_stat['xpts'] - full_stat['pts']
+
+    full_stat['xG90'] = full_stat['xG'] / full_stat['matches']
+    full_stat['xGA90'] = full_stat['xGA'] / full_stat['matches']
+
+    return full_stat
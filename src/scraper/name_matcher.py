@@ -0,0 +1,78 @@
+# ###################################################################################
+# player name matching between FPL elements and understat players
+# ###################################################################################
+# Names are normalised once when the index is built and indexed by
+# (team title, name token), so each FPL element is matched against a handful of
+# candidates from its own team instead of every understat player in the league.
+import json
+import os
+
+import unidecode
+
+# persisted table of known mismatches: FPL element code -> understat player id
+OVERRIDES_FILE = 'src/scraper/name_overrides.json'
+
+
+# normalise a player name for matching, e.g. "Ødegaard" -> "odegaard"
+def normalise_name(name):
+    return unidecode.unidecode(name).replace('-', ' ').lower().strip()
+
+
+# load the name override table, ignoring comment keys
+def load_overrides(path=OVERRIDES_FILE):
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as infile:
+        overrides = json.load(infile)
+    return {code: xg_id for code, xg_id in overrides.items() if not code.startswith('_')}
+
+
+class PlayerNameIndex:
+    # players is the understat {player id: player data} mapping from playersData
+    def __init__(self, players, overrides=None):
+        self.players = players
+        self.overrides = overrides if overrides is not None else load_overrides()
+        self.names = {}
+        self.index = {}
+        for xg_id, player in players.items():
+            name = normalise_name(player['player_name'])
+            self.names[xg_id] = name
+            # players transferred mid-season are listed as "Team A,Team B"
+            for team in player['team_title'].split(','):
+                for token in set(name.split()):
+                    self.index.setdefault((team.strip(), token), []).append(xg_id)
+
+    # return the understat id of the single best match for an FPL element, or None
+    def match(self, fpl_asset):
+        code = str(fpl_asset.get('code'))
+        if code in self.overrides:
+            xg_id = self.overrides[code]
+            return xg_id if xg_id in self.players else None
+
+        query = normalise_name(fpl_asset['web_name'])
+        tokens = query.split()
+        if not tokens:
+            return None
+
+        candidates = [
+            xg_id for xg_id in self.index.get((fpl_asset.get('team_title'), tokens[0]), ())
+            if query in self.names[xg_id]
+        ]
+        if len(candidates) <= 1:
+            return candidates[0] if candidates else None
+
+        # several players share the web name (e.g. "Gabriel"), prefer an exact name,
+        # then the most tokens shared with the FPL full name, then minutes played
+        full_name = set(normalise_name(
+            fpl_asset.get('first_name', '') + ' ' + fpl_asset.get('second_name', '')
+        ).split())
+
+        def score(xg_id):
+            name = self.names[xg_id]
+            return (
+                name == query,
+                len(full_name & set(name.split())),
+                float(self.players[xg_id].get('time', 0)),
+            )
+
+        return max(candidates, key=score)
@@ -0,0 +1,62 @@
+# ###################################################################################
+# understat page parsing
+# ###################################################################################
+# understat embeds its data as JSON.parse('...') payloads in <script> tags, named
+# after the JavaScript variable they are assigned to. Rather than building a full
+# HTML tree, the raw page bytes are scanned once for every `name = JSON.parse('...')`
+# assignment and only the wanted payloads are decoded.
+import codecs
+import json
+import re
+
+# payloads of interest on league and player pages
+LEAGUE_PAGE_PAYLOADS = ('teamsData', 'playersData')
+PLAYER_PAGE_PAYLOADS = ('groupsData', 'minMaxPlayerStats', 'shotsData', 'matchesData')
+
+# bump when the parsed output changes, so memoised parse results are not reused
+PARSER_VERSION = 2
+
+# start of a `name = JSON.parse('payload')` assignment, the payload being a single
+# quoted JS string that runs up to the next unescaped quote
+PAYLOAD_START = re.compile(rb"(\w+)\s*=\s*JSON\.parse\(\s*'")
+
+
+# decode a JS string literal body. understat hex escapes the JSON (\x22 etc.)
+# and leaves non-ASCII characters as raw UTF-8, so undo the escapes at the byte
+# level before decoding as UTF-8.
+def decode_payload(raw):
+    return codecs.escape_decode(raw)[0].decode('utf8')
+
+
+# extract the named JSON payloads from a page, returning {name: parsed data}
+def extract_payloads(content, names):
+    if isinstance(content, str):
+        content = content.encode('utf8')
+
+    wanted = set(names)
+    payloads = {}
+    position = 0
+    while True:
+        match = PAYLOAD_START.search(content, position)
+        if match is None:
+            break
+        start = end = match.end()
+
+        # find the closing quote, skipping any preceded by an odd number of backslashes
+        while True:
+            end = content.find(b"'", end)
+            if end == -1:
+                return payloads
+            backslashes = 0
+            while content[end - 1 - backslashes] == 0x5c:
+                backslashes += 1
+            if backslashes % 2 == 0:
+                break
+            end += 1
+        position = end + 1
+
+        name = match.group(1).decode('ascii')
+        if name in wanted:
+            payloads[name] = json.loads(decode_payload(content[start:end]))
+
+    return payloads
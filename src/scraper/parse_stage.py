@@ -0,0 +1,141 @@
+# ###################################################################################
+# process pool parse stage for understat player pages
+# ###################################################################################
+# Player pages are fetched by a pool of threads, then each raw page body is handed
+# to a pool of worker processes for decoding, so parsing runs on every core rather
+# than contending for the GIL with the fetch threads. Parsed pages are yielded as
+# soon as each one completes, letting the writer stream them out while the rest
+# are still being fetched and parsed.
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
+import os
+import time
+
+from page_parser import PARSER_VERSION, PLAYER_PAGE_PAYLOADS, extract_payloads
+from telemetry import stages
+
+# number of parser processes, override with SCRAPER_PARSE_WORKERS env variable.
+# 0 parses in the fetch threads instead, for hosts where processes are unwelcome
+PARSE_WORKERS = int(os.environ.get('SCRAPER_PARSE_WORKERS', os.cpu_count() or 1))
+
+# name parse results are memoised under in the response cache
+PLAYER_PAGE_MEMO = f'player{PARSER_VERSION}'
+
+
+# build the groups, stats, shot and matches datasets from a player page, keyed by
+# dataset name. Runs in a worker process, so it only takes and returns plain data.
+def parse_player_page(content):
+    payloads = extract_payloads(content, PLAYER_PAGE_PAYLOADS)
+
+    datasets = {}
+    if 'groupsData' in payloads:
+        datasets['groupsdata'] = payloads['groupsData']
+
+    if 'minMaxPlayerStats' in payloads:
+        datasets['statsdata'] = payloads['minMaxPlayerStats']
+
+    if 'shotsData' in payloads:
+        shot_data = payloads['shotsData']
+
+        # ensure correct naming and format of x and y co-ords for each shot
+        # deliberately reversed for display on map
+        for shot in shot_data:
+            shot['x'] = float(shot['Y'])
+            shot['y'] = float(shot['X'])
+
+        datasets['shotdata'] = shot_data
+
+    if 'matchesData' in payloads:
+        datasets['matchesdata'] = payloads['matchesData']
+
+    return datasets
+
+
+# parse_player_page, also returning the time it took in the worker
+def timed_parse_player_page(content):
+    started = time.perf_counter()
+    datasets = parse_player_page(content)
+    return datasets, time.perf_counter() - started
+
+
+# worker processes are spawned rather than forked, as the parent holds live HTTP
+# and Firestore threads whose locks a forked child could inherit mid-use
+def make_parse_pool(workers=PARSE_WORKERS):
+    if workers <= 0:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+# fetch every url in a {key: url} mapping and parse each page with parse_player_page,
+# yielding (key, datasets) as each page completes. Parse results are reused from the
+# response cache when the page body is unchanged. Failed pages are logged and yielded
+# as None so a single bad asset does not abort the whole run. Keys whose parse was
+# reused are added to memo_hits, if given. If a parser process dies the pool is
+# broken for good, so its pages and the rest of the run are parsed in the fetch
+# threads instead.
+def fetch_and_parse(urls, fetch, workers, parse_pool=None, cache=None, memo_hits=None):
+    if not urls:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as fetchers:
+        fetch_futures = {fetchers.submit(fetch, url): key for key, url in urls.items()}
+        parse_futures = {}
+        pending = set(fetch_futures)
+
+        def submit_parse(content):
+            nonlocal parse_pool
+            if parse_pool is not None:
+                try:
+                    return parse_pool.submit(timed_parse_player_page, content)
+                except BrokenProcessPool as err:
+                    logging.error(f'Parse pool broken, parsing in fetch threads: {err}')
+                    parse_pool = None
+            return fetchers.submit(timed_parse_player_page, content)
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetch_futures:
+                    key = fetch_futures[future]
+                    try:
+                        res = future.result()
+                    except Exception as err:
+                        logging.error(f'Fetch failed for {urls[key]}: {err}')
+                        yield key, None
+                        continue
+
+                    digest = getattr(res, 'digest', None) if cache is not None else None
+                    if digest is not None:
+                        datasets = cache.load_parsed(digest, PLAYER_PAGE_MEMO)
+                        if datasets is not None:
+                            if memo_hits is not None:
+                                memo_hits.add(key)
+                            yield key, datasets
+                            continue
+
+                    parse_future = submit_parse(res.content)
+                    parse_futures[parse_future] = (key, digest, res.content)
+                    pending.add(parse_future)
+                else:
+                    key, digest, content = parse_futures.pop(future)
+                    try:
+                        datasets, seconds = future.result()
+                    except BrokenProcessPool as err:
+                        if parse_pool is not None:
+                            logging.error(f'Parse pool broken, parsing in fetch threads: {err}')
+                            parse_pool = None
+                        parse_future = fetchers.submit(timed_parse_player_page, content)
+                        parse_futures[parse_future] = (key, digest, content)
+                        pending.add(parse_future)
+                        continue
+                    except Exception as err:
+                        logging.error(f'Parse failed for {urls[key]}: {err}')
+                        yield key, None
+                        continue
+                    stages.add('parse', seconds)
+
+                    if digest is not None:
+                        cache.store_parsed(digest, PLAYER_PAGE_MEMO, datasets)
+                    yield key, datasets
@@ -0,0 +1,805 @@
+# ###################################################################################
+# xG data scrape pipeline
+# ###################################################################################
+# Importable form of the scraper. A Pipeline holds the state worth keeping warm
+# between runs (Firestore client and sink, the shared HTTP client and response
+# cache, the player name index and the last snapshot) and Pipeline.run() performs
+# one full or incremental scrape.
+import pandas as pd # data processing, CSV file I/O (e.g. pd.read_csv)
+from requests.exceptions import HTTPError
+from concurrent.futures.process import BrokenProcessPool
+import copy
+import json
+from datetime import datetime
+import os
+import logging
+import time
+import firebase_admin
+from firebase_admin import credentials
+from firebase_admin import firestore
+import columnar_store
+from fetcher import WORKERS, cache, client, fetch_all, fetch_json, fetch_payloads, fetch_response
+from name_matcher import PlayerNameIndex
+from firestore_sink import FirestoreSink
+from asset_writer import AssetWriter
+from checkpoint import Checkpoint
+import history_store
+from json_export import JsonExport
+from leaderboards import build_leaderboards
+from metrics import aggregate_team_stats, derive_asset_metrics
+from page_parser import LEAGUE_PAGE_PAYLOADS
+from parse_stage import fetch_and_parse, make_parse_pool
+from read_service import build_snapshot
+from run_state import build_run_state, current_gameweek, load_run_state, plan_refresh, save_run_state, season_id
+import shot_maps
+import snapshot_db
+from team_fixtures import build_team_fixtures
+from team_registry import TeamRegistry
+from telemetry import profile_run, stage_delta, stages, write_run_summary
+
+# ###################################################################################
+# configure constants
+# ###################################################################################
+# url for fpl data
+fpl_url = 'https://fantasy.premierleague.com/api/bootstrap-static/'
+
+# url for fpl detailed asset data
+fpl_asset_data_url = 'https://fantasy.premierleague.com/api/element-summary/'
+
+# url for fpl fixtures data
+fpl_fixtures_url = 'https://fantasy.premierleague.com/api/fixtures/'
+
+# create urls for all seasons of all leagues
+base_url = 'https://understat.com/league'
+all_leagues = ['La_liga', 'EPL', 'Bundesliga', 'Serie_A', 'Ligue_1', 'RFPL']
+all_seasons = ['2014', '2015', '2016', '2017', '2018', '2019', '2020', '2021', '2022']
+
+# league and season matching the fpl game, whose players are merged with fpl assets
+fpl_league = 'EPL'
+fpl_season = '2022'
+
+# leagues and seasons scraped on each run, backfill covers the rest
+leagues = [fpl_league]
+seasons = [fpl_season]
+
+# create base url for the asset data
+asset_data_url = 'https://understat.com/player'
+
+# team stats copied from the league table into each team's output
+TEAM_STAT_FIELDS = [
+    'matches', 'wins', 'draws', 'loses', 'scored', 'missed', 'pts', 'xG', 'npxG', 'xGA', 'npxGA', 'npxGD',
+    'ppda_coef', 'oppda_coef', 'deep', 'deep_allowed', 'xpts', 'xpts_diff', 'xG_diff', 'xGA_diff', 'xG90', 'xGA90',
+]
+
+# ###################################################################################
+# data output directories
+# ###################################################################################
+DATADIR = ("src/scraper/data")
+LOGSDATADIR = ("src/scraper/data/logs")
+FPLDATADIR = ("src/scraper/data/fpldetaileddata")
+GROUPSDATADIR = ("src/scraper/data/groupsdata")
+STATSDATADIR = ("src/scraper/data/statsdata")
+SHOTDATADIR = ("src/scraper/data/shotdata")
+MATCHESDATADIR = ("src/scraper/data/matchesdata")
+
+# per asset datasets parsed from understat player pages, with their db collection
+PLAYER_DATASETS = {
+    'groupsdata': 'assetgroupsdata',
+    'statsdata': 'assetstatdata',
+    'shotdata': 'assetshotdata',
+    'matchesdata': 'assetmatchesdata',
+}
+
+# db collection of every dataset in an asset's bundle of outputs
+ASSET_DATASETS = dict(PLAYER_DATASETS, fpldetaileddata='assetdetaileddata')
+
+
+# create data output directories if none exist
+def make_data_dirs():
+    for directory in (DATADIR, LOGSDATADIR, FPLDATADIR, GROUPSDATADIR, STATSDATADIR, SHOTDATADIR, MATCHESDATADIR):
+        # If folder doesn't exist, then create it.
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+
+# Create logger file and configuration
+def configure_logging():
+    if not os.path.isdir(LOGSDATADIR):
+        os.makedirs(LOGSDATADIR)
+    LOGSDATAFILE = (LOGSDATADIR + '/scraperDebugLog')
+    logging.basicConfig(level=logging.DEBUG, filename=LOGSDATAFILE)
+
+
+# configure Firebase db access
+def init_db():
+    cred = credentials.Certificate("src/scraper/serviceAccountKey.json")
+    firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+
+# ###################################################################################
+# get fpl data from endpoint and build output
+# ###################################################################################
+def fetch_bootstrap():
+    try:
+        fpl_res = client.get(fpl_url)
+        # access JSON content
+        fpl_json_data = fpl_res.json()
+
+        # output json response output for error checking
+        with open('./src/scraper/data/fpldata.json', 'w+') as outfile:
+            json.dump(fpl_json_data, outfile, indent=4, sort_keys=True)
+
+    except HTTPError as http_err:
+        logging.error(f'HTTP error occurred: {http_err}')
+        raise
+    except Exception as err:
+        logging.error(f'Other error occurred: {err}')
+        raise
+
+    return fpl_json_data
+
+
+# ###################################################################################
+# url of the understat page for a league season
+# ###################################################################################
+def league_url(league, season):
+    return base_url+'/'+league+'/'+season
+
+
+# ###################################################################################
+# build the league table for a season from its understat teams data
+# ###################################################################################
+def build_league_table(team_json_data):
+    # aggregate all teams' history in one pass, with derived diffs and per game stats
+    full_stat = aggregate_team_stats(team_json_data)
+
+    full_stat = full_stat[['team', 'matches', 'wins', 'draws', 'loses', 'scored', 'missed', 'pts', 'xG', 'npxG', 'xGA', 'npxGA', 'npxGD', 'ppda_coef', 'oppda_coef', 'deep', 'deep_allowed', 'xpts', 'xG_diff', 'xGA_diff', 'xpts_diff', 'xG90', 'xGA90']]
+    full_stat.sort_values('pts', ascending=False, inplace=True)
+    full_stat.reset_index(inplace=True, drop=True)
+    full_stat['position'] = range(1,len(full_stat)+1)
+
+    # get timestamp
+    dateTimeObj = datetime.now()
+    timestampStr = dateTimeObj.strftime("%d-%b-%Y (%H:%M:%S.%f)")
+    full_stat['date'] = timestampStr
+
+    cols_to_int = ['wins', 'draws', 'loses', 'scored', 'missed', 'pts', 'deep', 'deep_allowed']
+    full_stat[cols_to_int] = full_stat[cols_to_int].astype(int)
+
+    col_order = ['position', 'team', 'matches', 'wins', 'draws', 'loses', 'scored', 'missed', 'pts', 'xG', 'xG_diff', 'npxG', 'xG90', 'xGA', 'xGA_diff', 'npxGA', 'xGA90', 'npxGD', 'ppda_coef', 'oppda_coef', 'deep', 'deep_allowed', 'xpts', 'xpts_diff', 'date']
+    full_stat = full_stat[col_order]
+    full_stat = full_stat.set_index('position')
+
+    return full_stat
+
+
+# ###################################################################################
+# get xG Data from endpoint for every league season, fetched concurrently. Returns
+# the aggregated team stats along with each page's team and player payloads, keyed
+# by (league, season)
+# ###################################################################################
+def scrape_league_data():
+    cells = [(league, season) for league in leagues for season in seasons]
+    # Based on the structure of the webpage, xgdata is in JSON variables under <script> tags.
+    # League pages are checked with the server every run, as their totals change after
+    # every match
+    league_pages = fetch_all(
+        {cell: league_url(*cell) for cell in cells},
+        lambda url: fetch_payloads(url, LEAGUE_PAGE_PAYLOADS, revalidate=True)
+    )
+
+    full_data = dict()
+    for league in leagues:
+        season_data = dict()
+        for season in seasons:
+            if league_pages[(league, season)] is None:
+                raise RuntimeError(f'Failed to fetch league page {league_url(league, season)}')
+            season_data[season] = build_league_table(league_pages[(league, season)]['teamsData'])
+
+        df_season = pd.concat(season_data)
+        full_data[league] = df_season
+
+    data = pd.concat(full_data)
+    data.to_csv('./src/scraper/data/xgdata_scrape.csv')
+
+    return data, league_pages
+
+
+# ###################################################################################
+# build final team json output, merging xgdata team stats with fpl team data
+# ###################################################################################
+def build_team_dataset(team_json_data, full_data, registry):
+    team_dataset = copy.deepcopy(team_json_data)
+    json_data = full_data.to_json(orient='records')
+    team_stats = {team['team']: team for team in json.loads(json_data)}
+    for data in team_dataset:
+        team = registry.by_understat_id[data]
+        if 'code' in team:
+            team_dataset[data]['code'] = team['code']
+            for teamHistory in team_dataset[data]['history']:
+                teamHistory['code'] = team['code']
+                teamHistory['id'] = data
+
+        stats = team_stats.get(team_dataset[data]['title'])
+        if stats is not None:
+            for field in TEAM_STAT_FIELDS:
+                team_dataset[data][field] = stats[field]
+
+        # fpl team name and id, for teams linked to an fpl team
+        if 'code' in team:
+            team_dataset[data]['name'] = team['name']
+            team_dataset[data]['short_name'] = team['short_name']
+            team_dataset[data]['id'] = team['id']
+
+    return team_dataset
+
+
+# ###################################################################################
+# Find data for assets
+# ###################################################################################
+def build_assets(players_data, registry):
+    # get assets and their relevant ids and put them into separate dictionary
+    assets = {}
+    for di in players_data:
+        assets[di['id']]={}
+        for k in di.keys():
+            if k =='id': continue
+            assets[di['id']][k]=di[k]
+
+    # get timestamp
+    dateTimeObj = datetime.now()
+    timestampStr = dateTimeObj.strftime("%d-%b-%Y (%H:%M:%S.%f)")
+
+    # add relevant data to each asset
+    for asset in assets:
+        team = registry.by_title.get(assets[asset]['team_title'])
+        if team is not None and 'code' in team:
+            assets[asset]['team_code'] = team['code']
+            assets[asset]['date'] = timestampStr
+
+    return assets
+
+
+# ###################################################################################
+# match each fpl asset to its xgdata asset, ready for the fetch stage
+# ###################################################################################
+def match_assets(fpl_asset_data, name_index, registry):
+    asset_xg_matches = {}
+    for fpl_asset in fpl_asset_data:
+        # set asset team "title"
+        team = registry.by_fpl_code.get(fpl_asset['team_code'])
+        if team is not None:
+            fpl_asset['team_title'] = team['title']
+
+        # search for asset xG data, if in database
+        asset_xg_matches[fpl_asset['id']] = name_index.match(fpl_asset)
+
+    return asset_xg_matches
+
+
+# ###################################################################################
+# assets to refresh this run: all of them on a full run, otherwise only those whose
+# team has played, who have moved team, or who have no stored detailed data yet
+# ###################################################################################
+def select_refresh_assets(fpl_asset_data, refresh_teams, run_state, writer):
+    refresh_asset_ids = set()
+    for fpl_asset in fpl_asset_data:
+        if (refresh_teams is None
+                or fpl_asset['team'] in refresh_teams
+                or run_state.get('asset_teams', {}).get(str(fpl_asset['id'])) != fpl_asset['team']
+                or not writer.has(fpl_asset['id'], 'fpldetaileddata')):
+            refresh_asset_ids.add(fpl_asset['id'])
+
+    return refresh_asset_ids
+
+
+# ###################################################################################
+# fetch fpl detailed data for all assets concurrently
+# ###################################################################################
+def fetch_asset_data(fpl_asset_data, refresh_asset_ids, writer):
+    fpl_asset_json_responses = fetch_all(
+        {asset_id: fpl_asset_data_url + str(asset_id) + '/' for asset_id in refresh_asset_ids},
+        stages.timed('summary_fetch', fetch_json)
+    )
+
+    # unchanged assets reuse the detailed data stored by a previous run
+    for fpl_asset in fpl_asset_data:
+        if fpl_asset['id'] not in refresh_asset_ids:
+            fpl_asset_json_responses[fpl_asset['id']] = writer.read(fpl_asset['id'], 'fpldetaileddata')
+
+    return fpl_asset_json_responses
+
+
+# ###################################################################################
+# add asset xgdata to fpl asset to build final asset data output
+# ###################################################################################
+def merge_assets(fpl_asset_data, team_dataset, registry, assets, asset_xg_matches,
+                 fpl_asset_json_responses, refresh_asset_ids, sink, exports):
+    # xG data and derived metrics for all matched assets, computed in one pass
+    asset_metrics = derive_asset_metrics(fpl_asset_data, assets, asset_xg_matches)
+
+    asset_db_data = [{}] * len(fpl_asset_data)
+    for idx, fpl_asset in enumerate(fpl_asset_data):
+        # add team defensive data to asset
+        team = registry.by_fpl_code.get(fpl_asset['team_code'])
+        if team is not None and team['understat_id'] in team_dataset:
+            team_data = team_dataset[team['understat_id']]
+            fpl_asset['GA'] = team_data['missed']
+            fpl_asset['xGA'] = team_data['xGA']
+            fpl_asset['xGA90'] = team_data['xGA90']
+            fpl_asset['xGA_diff'] = team_data['xGA_diff']
+        # reset each asset to zero
+        fpl_asset['date'] = 0 #assets[asset]['date']
+        fpl_asset['games'] = 0
+        fpl_asset['key_passes'] = 0
+        fpl_asset['position'] = 0
+        fpl_asset['npg'] = 0
+        fpl_asset['npxG'] = 0
+        fpl_asset['shots'] = 0
+        fpl_asset['xA'] = 0
+        fpl_asset['xG'] = 0
+        fpl_asset['xGBuildup'] = 0
+        fpl_asset['xGChain'] = 0
+        fpl_asset['xG_diff'] = 0
+        fpl_asset['npxG_diff'] = 0
+        fpl_asset['xA_diff'] = 0
+        fpl_asset['xG90'] = 0
+        fpl_asset['npxG90'] = 0
+        fpl_asset['xA90'] = 0
+        fpl_asset['npg_minutes'] = 0
+        fpl_asset['goals90'] = 0
+        fpl_asset['goals_minutes'] = 0
+        fpl_asset['npg90'] = 0
+        fpl_asset['shots90'] = 0
+        fpl_asset['kp90'] = 0
+
+        # asset id to string
+        asset_id_string = str(fpl_asset['id'])
+
+        # #################################################################################
+        # Get FPL detailed data for asset, already fetched by the fetch stage
+        refresh_asset = fpl_asset['id'] in refresh_asset_ids
+        fpl_asset_json_data = fpl_asset_json_responses[fpl_asset['id']]
+        if fpl_asset_json_data is not None and refresh_asset:
+            # write asset detailed data to db, its file is written with the asset's bundle
+            sink.set('assetdetaileddata', asset_id_string, fpl_asset_json_data)
+
+        # #################################################################################
+        # add asset xG data and derived metrics, if in database
+        if fpl_asset['id'] in asset_metrics:
+            fpl_asset.update(asset_metrics[fpl_asset['id']])
+
+        # #################################################################################
+        # copy data into database holding array ready to be written to db
+        asset_db_data[idx] = {key: fpl_asset[key] for key in fpl_asset.keys() & {'id','key_passes','games','position','npg','npxG','shots','xA','xG','xGBuildup','xGChain','xG_diff','npxG_diff','xA_diff','xG90','npxG90','xA90','npg_minutes','goals90','goals_minutes','npg90','shots90','kp90','GA','xGA','xGA90','xGA_diff'}}
+
+        # stream the finished asset out to the asset and database file exports
+        exports['assets'].write(fpl_asset)
+        exports['database'].write(asset_db_data[idx])
+
+    return asset_db_data
+
+
+# ###################################################################################
+# write a refreshed asset's bundle of outputs in one go: its fpl detailed data and
+# player page datasets, blank where missing. Datasets found are written to db too.
+# The asset is recorded as completed in the run's checkpoint only if fetched, that
+# is its fpl detailed data and player page, if it has one, did not fail, so a
+# resumed run fetches it again.
+# ###################################################################################
+def write_asset_bundle(asset_id, fpl_asset_json_data, datasets, writer, sink, checkpoint, fetched=True):
+    asset_id_string = str(asset_id)
+    bundle = {}
+    # fpl detailed data is written to db by merge_assets
+    db_datasets = []
+    if fpl_asset_json_data is not None:
+        bundle['fpldetaileddata'] = fpl_asset_json_data
+        db_datasets.append('fpldetaileddata')
+
+    for name, collection in PLAYER_DATASETS.items():
+        bundle[name] = {name: datasets.get(name, [])}
+        if name in datasets:
+            sink.set(collection, asset_id_string, bundle[name])
+            db_datasets.append(name)
+
+    with stages.stage('file_write'):
+        writer.write(asset_id, bundle)
+    if fetched and fpl_asset_json_data is not None:
+        checkpoint.record(asset_id, bundle, db_datasets)
+
+
+# ###################################################################################
+# write the stored outputs of assets completed by an interrupted run to db again,
+# as its batched db writes may not all have been committed, and queue their shots
+# and matches for the columnar store, only written at the end of a run
+# ###################################################################################
+def resend_asset_bundles(resumed, asset_xg_matches, sink, columnar=None):
+    for asset_id, (bundle, db_datasets) in resumed.items():
+        for name in db_datasets:
+            sink.set(ASSET_DATASETS[name], str(asset_id), bundle[name])
+        if columnar is not None and asset_xg_matches.get(asset_id) is not None:
+            columnar.add(asset_xg_matches[asset_id], {
+                name: bundle[name][name] for name in ('shotdata', 'matchesdata') if bundle.get(name)
+            })
+
+
+# ###################################################################################
+# fetch and parse xgdata player pages for refreshed assets, writing each asset's
+# outputs as soon as its page is parsed. Refreshed assets without a page, being
+# unmatched or failing to fetch, are written with blank player datasets.
+# ###################################################################################
+def write_asset_outputs(asset_xg_matches, fpl_asset_json_responses, refresh_asset_ids,
+                        parse_pool, sink, writer, checkpoint, snapshot_store=None, columnar=None):
+    # fpl assets for each xgdata asset, usually one but overrides can share a page
+    xg_asset_ids = {}
+    for asset_id, asset in asset_xg_matches.items():
+        if asset is not None and asset_id in refresh_asset_ids:
+            xg_asset_ids.setdefault(asset, []).append(asset_id)
+
+    # pages unchanged since they were last parsed
+    memo_hits = set()
+    player_pages = fetch_and_parse(
+        {asset: asset_data_url + '/' + asset for asset in xg_asset_ids},
+        stages.timed('understat_fetch', fetch_response),
+        WORKERS, parse_pool, cache, memo_hits
+    )
+
+    written = set()
+    try:
+        for asset, datasets in player_pages:
+            # typed shots and matches for the columnar store, unless already stored
+            if datasets and columnar is not None and not (asset in memo_hits and columnar.has(asset)):
+                columnar.add(asset, datasets)
+            if datasets and snapshot_store is not None:
+                with stages.stage('snapshot_db_write'):
+                    snapshot_store.write_player(asset, datasets)
+
+            for asset_id in xg_asset_ids[asset]:
+                write_asset_bundle(
+                    asset_id, fpl_asset_json_responses[asset_id], datasets or {}, writer, sink, checkpoint,
+                    fetched=datasets is not None
+                )
+                written.add(asset_id)
+
+        for asset_id in refresh_asset_ids - written:
+            write_asset_bundle(asset_id, fpl_asset_json_responses[asset_id], {}, writer, sink, checkpoint)
+
+        with stages.stage('file_write'):
+            writer.commit()
+        if columnar is not None:
+            with stages.stage('columnar_write'):
+                columnar.commit()
+    except Exception:
+        writer.abort()
+        if columnar is not None:
+            columnar.abort()
+        raise
+
+
+# ###################################################################################
+# open the streamed asset and team file exports, moved into place by write_outputs
+# ###################################################################################
+def open_exports():
+    return {
+        # databse file for error checking
+        'database': JsonExport('./src/scraper/data/database_file.json', 'assets'),
+        'assets': JsonExport('./src/scraper/data/xgdata_assets.json', 'assets'),
+        'teams': JsonExport('./src/scraper/data/xgdata_teams.json', 'teams'),
+    }
+
+
+# ###################################################################################
+# write final asset and team outputs to db and data files
+# ###################################################################################
+def write_outputs(asset_db_data, team_fixtures_db_data, leaderboards, sink, exports):
+    # write asset data to database
+    sink.set('assetdata', 'general', {"assets": asset_db_data})
+
+    # write team data to db
+    sink.set('teamdata', 'general', {"teams": team_fixtures_db_data})
+
+    # write each ranked leaderboard to db, as its own small document
+    for board_id, board in leaderboards.items():
+        sink.set('leaderboards', board_id, board)
+
+    # commit any outstanding db writes
+    with stages.stage('firestore_flush'):
+        sink.flush()
+
+    with stages.stage('file_write'):
+        for team in team_fixtures_db_data:
+            exports['teams'].write(team)
+
+        # finish the exports, replacing any previous data files
+        for export in exports.values():
+            export.close()
+
+
+# ###################################################################################
+# write refreshed team outputs on their own, to db and the teams data file
+# ###################################################################################
+def write_team_outputs(team_fixtures_db_data, sink):
+    sink.set('teamdata', 'general', {"teams": team_fixtures_db_data})
+    with stages.stage('firestore_flush'):
+        sink.flush()
+
+    with stages.stage('file_write'):
+        export = JsonExport('./src/scraper/data/xgdata_teams.json', 'teams')
+        try:
+            for team in team_fixtures_db_data:
+                export.write(team)
+        except Exception:
+            export.abort()
+            raise
+        export.close()
+
+
+# change in each counter since a previous snapshot of the counters
+def counter_delta(before, after):
+    return {key: after[key] - before.get(key, 0) for key in after}
+
+
+class Pipeline:
+    def __init__(self, db=None, read_service=None):
+        make_data_dirs()
+        self.db = db if db is not None else init_db()
+
+        # all document writes are batched, and skipped when unchanged since the last run
+        self.sink = FirestoreSink(self.db)
+
+        # name index, rebuilt only when the understat player list changes
+        self.name_index = None
+        self.name_index_key = None
+
+        # understat and fpl team links, cached between runs
+        self.team_registry = TeamRegistry()
+
+        # per-asset output files
+        self.writer = AssetWriter()
+
+        # typed shots and matches, written once per season at the end of each run
+        self.columnar = columnar_store.ColumnarWriter() if columnar_store.ENABLED else None
+
+        # indexed local copy of each run's outputs
+        self.snapshot_store = snapshot_db.SnapshotStore() if snapshot_db.ENABLED else None
+
+        # append-only history of each run's asset and team metrics
+        self.history = history_store.HistoryStore() if history_store.ENABLED else None
+
+        # worker processes for parsing player pages
+        self.parse_pool = None
+
+        # asset and team data from the last successful run
+        self.snapshot = None
+
+        # in-memory read service, given each successful run's outputs
+        self.read_service = read_service
+
+    # parser processes are started on first use and kept for later runs
+    def _get_parse_pool(self):
+        if self.parse_pool is not None:
+            # a pool whose worker died refuses every submit, so replace it
+            try:
+                self.parse_pool.submit(int).result()
+            except BrokenProcessPool:
+                logging.warning('Parse pool broken, starting a new one')
+                self.parse_pool.shutdown(wait=False)
+                self.parse_pool = None
+        if self.parse_pool is None:
+            self.parse_pool = make_parse_pool()
+        return self.parse_pool
+
+    def _get_name_index(self, assets):
+        key = tuple((asset, data['player_name'], data['team_title']) for asset, data in assets.items())
+        if key != self.name_index_key:
+            self.name_index = PlayerNameIndex(assets)
+            self.name_index_key = key
+        return self.name_index
+
+    # run one scrape, profiled if SCRAPER_PROFILE is set, returning a summary of the
+    # run which is also written to the logs directory
+    def run(self, incremental=False, resume=False):
+        with profile_run() as profile:
+            summary = self._run(incremental, resume)
+        if profile:
+            summary['profile'] = profile
+
+        logging.info(f'Scraper run summary: {summary}')
+        write_run_summary(summary)
+        return summary
+
+    def _run(self, incremental, resume):
+        started_at = datetime.now().isoformat()
+        started = time.time()
+        http_before = client.stats()
+        sink_before = self.sink.stats()
+        cache_before = cache.stats() if cache is not None else {}
+        stages_before = stages.stats()
+
+        with stages.stage('bootstrap'):
+            fpl_json_data = fetch_bootstrap()
+        if self.snapshot_store is not None:
+            self.snapshot_store.start_run(incremental)
+
+        # work out which teams have played since the last run, for incremental runs
+        with stages.stage('fixtures'):
+            run_state = load_run_state()
+            fpl_fixtures_json_data = fetch_json(fpl_fixtures_url)
+            fixture_state, refresh_teams = plan_refresh(fpl_json_data, fpl_fixtures_json_data, run_state)
+        if not incremental:
+            refresh_teams = None
+
+        if refresh_teams is None:
+            logging.info('Running full refresh of all assets')
+        else:
+            logging.info(f'Running incremental refresh of teams {sorted(refresh_teams)}')
+
+        # only the fpl league season's teams and players are merged with fpl data
+        with stages.stage('league'):
+            full_data, league_pages = scrape_league_data()
+        with stages.stage('merge'):
+            # link understat and fpl teams, registering every league season scraped
+            fpl_league_page = league_pages[(fpl_league, fpl_season)]
+            for (league, season), league_page in league_pages.items():
+                self.team_registry.register(league, season, league_page['teamsData'])
+            registry = self.team_registry.link_fpl(
+                fpl_league, fpl_season, fpl_league_page['teamsData'], fpl_league_page['playersData'], fpl_json_data
+            )
+
+            team_dataset = build_team_dataset(
+                fpl_league_page['teamsData'], full_data.loc[(fpl_league, fpl_season)], registry
+            )
+            assets = build_assets(fpl_league_page['playersData'], registry)
+
+            # each team's upcoming fixtures, from the fixtures feed
+            team_fixtures_db_data = build_team_fixtures(team_dataset.values(), fpl_fixtures_json_data)
+
+            fpl_asset_data = fpl_json_data['elements']
+            asset_xg_matches = match_assets(fpl_asset_data, self._get_name_index(assets), registry)
+
+        refresh_asset_ids = select_refresh_assets(fpl_asset_data, refresh_teams, run_state, self.writer)
+
+        # resume an interrupted run with the same plan, skipping the assets it completed
+        checkpoint = Checkpoint(
+            {
+                'season': season_id(fpl_json_data),
+                'gameweek': current_gameweek(fpl_json_data),
+                'incremental': refresh_teams is not None,
+            },
+            resume
+        )
+        resumed = {
+            asset_id: completed for asset_id, completed in checkpoint.verified(self.writer.read).items()
+            if asset_id in refresh_asset_ids
+        }
+        refresh_asset_ids -= resumed.keys()
+
+        exports = None
+        try:
+            with stages.stage('asset_summaries'):
+                fpl_asset_json_responses = fetch_asset_data(
+                    fpl_asset_data, refresh_asset_ids, self.writer
+                )
+            resend_asset_bundles(resumed, asset_xg_matches, self.sink, self.columnar)
+
+            exports = open_exports()
+            with stages.stage('merge'):
+                asset_db_data = merge_assets(
+                    fpl_asset_data, team_dataset, registry, assets, asset_xg_matches,
+                    fpl_asset_json_responses, refresh_asset_ids, self.sink, exports
+                )
+            with stages.stage('asset_outputs'):
+                write_asset_outputs(
+                    asset_xg_matches, fpl_asset_json_responses, refresh_asset_ids,
+                    self._get_parse_pool(), self.sink, self.writer, checkpoint, self.snapshot_store,
+                    self.columnar
+                )
+            # bin the season's shots, once every refreshed asset's shots are stored
+            season_shot_maps = None
+            if shot_maps.ENABLED:
+                with stages.stage('shot_maps'):
+                    season_shot_maps = shot_maps.build_season_shot_maps(
+                        fpl_season, asset_xg_matches,
+                        {title: team.get('id', -1) for title, team in registry.by_title.items()},
+                        self.writer.read
+                    )
+            with stages.stage('leaderboards'):
+                leaderboards = build_leaderboards(fpl_asset_data, team_dataset.values())
+            with stages.stage('outputs'):
+                write_outputs(asset_db_data, team_fixtures_db_data, leaderboards, self.sink, exports)
+
+            if self.snapshot_store is not None:
+                with stages.stage('snapshot_db'):
+                    self.snapshot_store.write_snapshot(
+                        fpl_asset_data, team_fixtures_db_data, fpl_fixtures_json_data,
+                        season_id(fpl_json_data), current_gameweek(fpl_json_data)
+                    )
+
+            if self.history is not None:
+                with stages.stage('history'):
+                    self.history.append(
+                        started_at, current_gameweek(fpl_json_data), season_id(fpl_json_data) or fpl_season,
+                        fpl_asset_data, team_dataset.values()
+                    )
+
+            # record run state for the next incremental run
+            save_run_state(build_run_state(fpl_json_data, fixture_state))
+
+            # persist the response cache index for the next run
+            if cache is not None:
+                cache.save()
+        except Exception:
+            # leave the previous run's exports in place, and the checkpoint to resume from
+            if exports is not None:
+                for export in exports.values():
+                    if not export.outfile.closed:
+                        export.abort()
+            checkpoint.close()
+            raise
+
+        checkpoint.complete()
+
+        self.snapshot = {'assets': asset_db_data, 'teams': team_fixtures_db_data}
+
+        # swap the read service over to this run's outputs
+        if self.read_service is not None:
+            with stages.stage('read_snapshot'):
+                self.read_service.publish(build_snapshot(
+                    fpl_asset_data, team_fixtures_db_data, leaderboards, season_shot_maps, self.writer.read,
+                    refresh_asset_ids | resumed.keys(), self.read_service.snapshot
+                ))
+
+        summary = {
+            'started_at': started_at,
+            'incremental': refresh_teams is not None,
+            'assets': len(fpl_asset_data),
+            'refreshed': len(refresh_asset_ids),
+            'resumed': len(resumed),
+            'elapsed': round(time.time() - started, 3),
+            'http': counter_delta(http_before, client.stats()),
+            'firestore': counter_delta(sink_before, self.sink.stats()),
+            'cache': counter_delta(cache_before, cache.stats()) if cache is not None else {},
+            'stages': stage_delta(stages_before, stages.stats()),
+        }
+        return summary
+
+    # refresh each team's upcoming fixtures from the fixtures feed alone, on top of
+    # the teams of the last run, or of the snapshot database after a restart
+    def refresh_fixtures(self):
+        started = time.time()
+        teams = self.snapshot['teams'] if self.snapshot is not None else None
+        if teams is None and self.snapshot_store is not None:
+            teams = self.snapshot_store.load_teams()
+        if not teams:
+            raise RuntimeError('No team data to refresh fixtures for, run the scraper first')
+
+        with stages.stage('fixtures'):
+            fpl_fixtures_json_data = fetch_json(fpl_fixtures_url)
+        team_fixtures_db_data = build_team_fixtures(teams, fpl_fixtures_json_data)
+        write_team_outputs(team_fixtures_db_data, self.sink)
+        if self.snapshot is not None:
+            self.snapshot['teams'] = team_fixtures_db_data
+        if self.read_service is not None and self.read_service.snapshot is not None:
+            self.read_service.publish(self.read_service.snapshot.with_teams(team_fixtures_db_data))
+
+        summary = {
+            'teams': len(team_fixtures_db_data),
+            'fixtures': len(fpl_fixtures_json_data),
+            'elapsed': round(time.time() - started, 3),
+        }
+        logging.info(f'Fixtures refresh summary: {summary}')
+        return summary
+
+    def close(self):
+        try:
+            self.sink.close()
+        finally:
+            client.close()
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown()
+            if self.snapshot_store is not None:
+                self.snapshot_store.close()
+            if self.columnar is not None:
+                self.columnar.close()
+            self.writer.close()
@@ -0,0 +1,220 @@
+# ###################################################################################
+# in-memory read service for the xG data scraper
+# ###################################################################################
+# Serves the latest run's outputs over local HTTP straight from memory, so clients
+# need not read Firestore or the large data files:
+#   /assets                      every asset, filter with ?team=<fpl team id>
+#                                and/or ?position=<element type>
+#   /assets/<id>                 one asset
+#   /assets/<id>/shots           an asset's understat shots
+#   /assets/<id>/matches         an asset's understat matches
+#   /assets/<id>/shotmap         an asset's binned shots this season, see
+#                                shot_maps.py, also /teams/<id>/shotmap and
+#                                /shotmap for the league
+#   /teams, /teams/<id>          teams with their upcoming fixtures
+#   /leaderboards/<board>        a ranked leaderboard, see leaderboards.py
+#   /meta                        snapshot version and counts
+# Every response body is serialized, gzip compressed and given an ETag when the
+# snapshot is built, so a request is a dict lookup. The gzip and identity
+# encodings carry different ETags. Conditional requests are answered with 304.
+# The pipeline builds a new snapshot at the end of each run and swaps it in
+# whole, so readers always see one complete run.
+from datetime import datetime
+import gzip
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import threading
+from urllib.parse import parse_qsl, urlsplit
+
+# port the daemon serves reads on, 0 to disable. Set with SCRAPER_READ_PORT
+READ_PORT = int(os.environ.get('SCRAPER_READ_PORT', 8300))
+READ_HOST = os.environ.get('SCRAPER_READ_HOST', '127.0.0.1')
+
+# query parameters of /assets, mapped to the asset field they filter on
+ASSET_FILTERS = {'team': 'team', 'position': 'element_type'}
+
+# player page datasets served per asset, by path
+PLAYER_DATASET_PATHS = {'shots': 'shotdata', 'matches': 'matchesdata'}
+
+
+# a response body, serialized and compressed once
+class Body:
+    def __init__(self, data):
+        self.raw = json.dumps(data, separators=(',', ':')).encode()
+        self.gzip = gzip.compress(self.raw, compresslevel=6)
+        # each encoding is a different representation, so gets its own strong ETag
+        digest = hashlib.sha1(self.raw).hexdigest()
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+
+
+# path and canonical query of a request, e.g. /assets?position=3&team=1
+def route_key(path, query=None):
+    query = sorted((query or {}).items())
+    return path + ('?' + '&'.join(f'{key}={value}' for key, value in query) if query else '')
+
+
+class Snapshot:
+    # assets and teams are the run's merged records, leaderboards its
+    # {board id: board}, shot_maps its ShotMaps if built and player_bodies
+    # {asset id: {path name: Body}} the per-asset dataset bodies. Pass run_routes
+    # to reuse the asset, leaderboard and shot map routes of a snapshot of the
+    # same run
+    def __init__(self, version, assets, teams, leaderboards, shot_maps, player_bodies, run_routes=None):
+        self.version = version
+        self.assets = assets
+        self.teams = [team for team in teams if team]
+        self.leaderboards = leaderboards
+        self.shot_maps = shot_maps
+        self.player_bodies = player_bodies
+        self.run_routes = run_routes if run_routes is not None else self._run_routes()
+
+        self.routes = dict(self.run_routes)
+        self.routes[route_key('/teams')] = Body(self.teams)
+        for team in self.teams:
+            self.routes[route_key(f'/teams/{team["id"]}')] = Body(team)
+
+        self.routes[route_key('/meta')] = Body({
+            'version': version,
+            'generated_at': datetime.now().isoformat(),
+            'assets': len(assets),
+            'teams': len(self.teams),
+        })
+
+    def _run_routes(self):
+        routes = {route_key('/assets'): Body(self.assets)}
+        groups = {}
+        for asset in self.assets:
+            routes[route_key(f'/assets/{asset["id"]}')] = Body(asset)
+            values = {name: str(asset.get(field)) for name, field in ASSET_FILTERS.items()}
+            for name, value in values.items():
+                groups.setdefault(route_key('/assets', {name: value}), []).append(asset)
+            groups.setdefault(route_key('/assets', values), []).append(asset)
+        for key, group in groups.items():
+            routes[key] = Body(group)
+
+        for asset_id, bodies in self.player_bodies.items():
+            for name, body in bodies.items():
+                routes[route_key(f'/assets/{asset_id}/{name}')] = body
+
+        for board_id, board in self.leaderboards.items():
+            routes[route_key(f'/leaderboards/{board_id}')] = Body(board)
+
+        if self.shot_maps is not None:
+            shot_maps = {f'/assets/{asset["id"]}/shotmap': self.shot_maps.player(asset['id']) for asset in self.assets}
+            shot_maps.update({f'/teams/{team["id"]}/shotmap': self.shot_maps.team(team['id']) for team in self.teams})
+            shot_maps['/shotmap'] = self.shot_maps.league()
+            for path, shot_map in shot_maps.items():
+                if shot_map is not None:
+                    routes[route_key(path)] = Body(shot_map)
+        return routes
+
+    # the same snapshot with new team records, e.g. after a fixtures refresh
+    def with_teams(self, teams):
+        return Snapshot(
+            self.version + 1, self.assets, teams, self.leaderboards, self.shot_maps, self.player_bodies,
+            self.run_routes
+        )
+
+    def lookup(self, path, query):
+        return self.routes.get(route_key(path, query))
+
+
+# build a snapshot of a run, taking the shots and matches of refreshed assets from
+# read(asset_id, dataset name) and reusing the previous snapshot's for the rest
+def build_snapshot(assets, teams, leaderboards, shot_maps, read, refreshed_ids, previous=None):
+    player_bodies = {}
+    for asset in assets:
+        asset_id = asset['id']
+        if previous is not None and asset_id not in refreshed_ids and asset_id in previous.player_bodies:
+            player_bodies[asset_id] = previous.player_bodies[asset_id]
+            continue
+        bodies = {}
+        for name, dataset in PLAYER_DATASET_PATHS.items():
+            data = read(asset_id, dataset)
+            bodies[name] = Body(data.get(dataset, []) if data else [])
+        player_bodies[asset_id] = bodies
+
+    version = previous.version + 1 if previous is not None else 1
+    return Snapshot(version, assets, teams, leaderboards, shot_maps, player_bodies)
+
+
+class ReadService:
+    def __init__(self, host=READ_HOST, port=READ_PORT):
+        self.snapshot = None
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'not_modified': 0, 'not_found': 0, 'bytes': 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    # swap in a new snapshot, seen whole by every request that starts after this
+    def publish(self, snapshot):
+        self.snapshot = snapshot
+        logging.info(f'Read service serving snapshot {snapshot.version} with {len(snapshot.routes)} routes')
+
+    def _count(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def _handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                # one snapshot for the whole request, however many swaps happen
+                snapshot = service.snapshot
+                service._count('requests')
+                url = urlsplit(self.path)
+                path = url.path.rstrip('/') or '/'
+                body = snapshot.lookup(path, dict(parse_qsl(url.query))) if snapshot is not None else None
+                if body is None:
+                    service._count('not_found')
+                    self._reply(404, b'{"error":"not found"}')
+                    return
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    content, headers = body.gzip, {'ETag': body.gzip_etag, 'Content-Encoding': 'gzip'}
+                else:
+                    content, headers = body.raw, {'ETag': body.etag}
+                if self.headers.get('If-None-Match') == headers['ETag']:
+                    service._count('not_modified')
+                    self._reply(304, headers={'ETag': headers['ETag']})
+                else:
+                    service._count('bytes', len(content))
+                    self._reply(200, content, headers)
+
+            def _reply(self, status, content=b'', headers=None):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Vary', 'Accept-Encoding')
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        logging.info(f'Read service listening on {self.server.server_address}')
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # snapshot of the request counters
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
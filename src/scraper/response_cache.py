@@ -0,0 +1,173 @@
+# ###################################################################################
+# persistent HTTP response cache for the xG data scraper
+# ###################################################################################
+# Responses are stored on disk keyed by URL, with bodies stored content-addressed
+# by their sha256 digest. A cached response younger than its endpoint's TTL is
+# served without touching the network, older ones are revalidated with
+# ETag/Last-Modified where the server supports it. Parse results are memoised by
+# body digest, so a body that has not changed is never parsed twice.
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+CACHE_DIR = 'src/scraper/data/cache'
+
+# seconds a response is served without revalidation, matched by longest url prefix.
+# Everything a scrape run fetches is revalidated, so its data is never older than
+# the run. Only the backfill of past league seasons, which do not change, is served
+# from the cache for a while
+ENDPOINT_TTLS = {
+    'https://understat.com/league/': 6 * 60 * 60,
+}
+DEFAULT_TTL = 0
+
+
+# response served by the cache, exposing the parts of requests.Response the
+# scraper uses plus the digest of its body
+class CachedResponse:
+    def __init__(self, url, content, digest, from_cache, status_code=200):
+        self.url = url
+        self.content = content
+        self.digest = digest
+        self.from_cache = from_cache
+        self.status_code = status_code
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        pass
+
+
+class ResponseCache:
+    def __init__(self, cache_dir=CACHE_DIR, ttls=ENDPOINT_TTLS):
+        self.cache_dir = cache_dir
+        self.bodies_dir = os.path.join(cache_dir, 'bodies')
+        self.parsed_dir = os.path.join(cache_dir, 'parsed')
+        self.index_file = os.path.join(cache_dir, 'index.json')
+        self.ttls = sorted(ttls.items(), key=lambda item: len(item[0]), reverse=True)
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'revalidated': 0, 'misses': 0, 'parse_hits': 0}
+
+        os.makedirs(self.bodies_dir, exist_ok=True)
+        os.makedirs(self.parsed_dir, exist_ok=True)
+
+        self.index = {}
+        if os.path.isfile(self.index_file):
+            try:
+                with open(self.index_file) as infile:
+                    self.index = json.load(infile)
+            except ValueError:
+                logging.warning(f'Discarding corrupt response cache index {self.index_file}')
+
+    def ttl(self, url):
+        for prefix, ttl in self.ttls:
+            if url.startswith(prefix):
+                return ttl
+        return DEFAULT_TTL
+
+    def _body_path(self, digest):
+        return os.path.join(self.bodies_dir, digest)
+
+    def _parsed_path(self, digest, name):
+        return os.path.join(self.parsed_dir, digest + '.' + name + '.json')
+
+    # cache entry for a url, only if its body is still on disk
+    def lookup(self, url):
+        with self.lock:
+            entry = self.index.get(url)
+        if entry is None or not os.path.isfile(self._body_path(entry['digest'])):
+            return None
+        return entry
+
+    def is_fresh(self, url, entry):
+        return time.time() - entry['fetched_at'] < self.ttl(url)
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    # serve a cached entry, either still fresh or just revalidated with a 304
+    def serve(self, url, entry, revalidated=False):
+        with open(self._body_path(entry['digest']), 'rb') as infile:
+            content = infile.read()
+        with self.lock:
+            if revalidated:
+                entry['fetched_at'] = time.time()
+                self.counters['revalidated'] += 1
+            else:
+                self.counters['hits'] += 1
+        return CachedResponse(url, content, entry['digest'], from_cache=True)
+
+    # store a fresh network response, writing its body only if not already stored
+    def store(self, url, res):
+        content = res.content
+        digest = hashlib.sha256(content).hexdigest()
+        body_path = self._body_path(digest)
+        if not os.path.isfile(body_path):
+            temp_path = body_path + '.temp.' + str(threading.get_ident())
+            with open(temp_path, 'wb') as outfile:
+                outfile.write(content)
+            os.replace(temp_path, body_path)
+
+        with self.lock:
+            self.index[url] = {
+                'digest': digest,
+                'etag': res.headers.get('ETag'),
+                'last_modified': res.headers.get('Last-Modified'),
+                'fetched_at': time.time(),
+            }
+            self.counters['misses'] += 1
+        return CachedResponse(url, content, digest, from_cache=False, status_code=res.status_code)
+
+    # previously stored parse result for a body digest and parser name, or None
+    def load_parsed(self, digest, name):
+        parsed_path = self._parsed_path(digest, name)
+        if not os.path.isfile(parsed_path):
+            return None
+        with open(parsed_path) as infile:
+            parsed = json.load(infile)
+        with self.lock:
+            self.counters['parse_hits'] += 1
+        return parsed
+
+    def store_parsed(self, digest, name, parsed):
+        parsed_path = self._parsed_path(digest, name)
+        temp_path = parsed_path + '.temp.' + str(threading.get_ident())
+        with open(temp_path, 'w') as outfile:
+            json.dump(parsed, outfile, separators=(',', ':'))
+        os.replace(temp_path, parsed_path)
+
+    # return parse(), memoised on disk by body digest and parser name
+    def memo(self, digest, name, parse):
+        parsed = self.load_parsed(digest, name)
+        if parsed is None:
+            parsed = parse()
+            self.store_parsed(digest, name, parsed)
+        return parsed
+
+    # persist the index and drop bodies and parse results no url refers to any more
+    def save(self):
+        with self.lock:
+            index = {url: dict(entry) for url, entry in self.index.items()}
+        temp_file = self.index_file + '.temp'
+        with open(temp_file, 'w') as outfile:
+            json.dump(index, outfile)
+        os.replace(temp_file, self.index_file)
+
+        live = {entry['digest'] for entry in index.values()}
+        for directory in (self.bodies_dir, self.parsed_dir):
+            for filename in os.listdir(directory):
+                if filename.split('.')[0] not in live:
+                    os.remove(os.path.join(directory, filename))
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
@@ -0,0 +1,126 @@
+# ###################################################################################
+# run state for incremental scraper runs
+# ###################################################################################
+# After each successful run we record which FPL fixtures had finished and when we
+# first saw them finish. The next incremental run compares this against the
+# current fixtures feed to work out which teams have played since, and only
+# those teams' assets are re-fetched and rewritten.
+from datetime import datetime
+import json
+import os
+import time
+
+RUN_STATE_FILE = 'src/scraper/data/run_state.json'
+
+# teams stay due a refresh for this long after a fixture finishes, as understat
+# and the FPL bonus points lag the final whistle
+REFRESH_WINDOW = float(os.environ.get('SCRAPER_REFRESH_WINDOW_HOURS', 24)) * 60 * 60
+
+
+def load_run_state(path=RUN_STATE_FILE):
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path) as infile:
+            return json.load(infile)
+    except ValueError:
+        return {}
+
+
+def save_run_state(state, path=RUN_STATE_FILE):
+    temp_file = path + '.temp'
+    with open(temp_file, 'w') as outfile:
+        json.dump(state, outfile, indent=4, sort_keys=True)
+    os.replace(temp_file, path)
+
+
+# identify the season from the first gameweek deadline, e.g. "2022"
+def season_id(bootstrap):
+    events = bootstrap.get('events') or [{}]
+    return (events[0].get('deadline_time') or '')[:4]
+
+
+def current_gameweek(bootstrap):
+    for event in bootstrap.get('events', []):
+        if event.get('is_current'):
+            return event['id']
+    return None
+
+
+def fixture_status(fixture):
+    if fixture.get('finished'):
+        return 'finished'
+    if fixture.get('finished_provisional'):
+        return 'provisional'
+    return None
+
+
+# time from kickoff to the final whistle, allowing for half time and stoppages
+MATCH_LENGTH = 2 * 60 * 60
+
+
+# time a fixture would have finished, from its kickoff time, or None if unknown
+def finish_time(fixture):
+    kickoff_time = fixture.get('kickoff_time')
+    if not kickoff_time:
+        return None
+    try:
+        kickoff = datetime.fromisoformat(kickoff_time.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return kickoff.timestamp() + MATCH_LENGTH
+
+
+# track every played fixture with the time its current status was first seen.
+# Fixtures not tracked before, on a first run or after the state is lost, are
+# taken to have been seen when they finished rather than now, so long finished
+# fixtures do not make their teams due a refresh
+def update_fixture_state(fixtures, previous, now):
+    fixture_state = {}
+    for fixture in fixtures:
+        status = fixture_status(fixture)
+        if status is None:
+            continue
+        fixture_id = str(fixture['id'])
+        seen = previous.get(fixture_id)
+        if seen is not None and seen['status'] == status:
+            fixture_state[fixture_id] = seen
+        else:
+            finished = finish_time(fixture) if seen is None else None
+            fixture_state[fixture_id] = {
+                'status': status,
+                'seen': min(now, finished) if finished is not None else now,
+                'teams': [fixture['team_h'], fixture['team_a']],
+            }
+    return fixture_state
+
+
+# FPL ids of teams with a fixture that finished within the refresh window, or
+# since the last successful run at completed_at, however long ago that was
+def dirty_teams(fixture_state, now, completed_at=None, window=REFRESH_WINDOW):
+    teams = set()
+    for fixture in fixture_state.values():
+        if now - fixture['seen'] < window or (completed_at is not None and fixture['seen'] > completed_at):
+            teams.update(fixture['teams'])
+    return teams
+
+
+# work out what an incremental run has to refresh. Returns the updated fixture
+# state and the set of FPL team ids to refresh, or None when a full run is needed
+# (first run, or a new season).
+def plan_refresh(bootstrap, fixtures, state, now=None):
+    now = time.time() if now is None else now
+    fixture_state = update_fixture_state(fixtures, state.get('fixtures', {}), now)
+    if not state or state.get('season') != season_id(bootstrap):
+        return fixture_state, None
+    return fixture_state, dirty_teams(fixture_state, now, state.get('completed_at'))
+
+
+def build_run_state(bootstrap, fixture_state, now=None):
+    return {
+        'season': season_id(bootstrap),
+        'gameweek': current_gameweek(bootstrap),
+        'fixtures': fixture_state,
+        'asset_teams': {str(element['id']): element['team'] for element in bootstrap['elements']},
+        'completed_at': time.time() if now is None else now,
+    }
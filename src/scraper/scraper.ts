@@ -6,18 +6,151 @@ const FIRST_RUN_TIMEOUT = 60 * 60 * 1000;
 /* interval between data scraper calls (ms) */
 const INTERVAL = 4 * 60 * 60 * 1000;
 
+/* every nth run is a full refresh, the rest only refresh teams that have played */
+const FULL_RUN_EVERY = 6;
+
+/* interval between team fixtures refreshes, in between data scraper calls (ms) */
+const FIXTURES_INTERVAL = 30 * 60 * 1000;
+
+/* number of data scraper runs so far */
+let runCount = 0;
+
+/* reply from the data scraper daemon, one per command sent */
+type ScraperReply = {
+  status: "ok" | "error";
+  summary?: Record<string, unknown>;
+  error?: string;
+};
+
+/* long running data scraper daemon, started on first use */
+let scraper: PythonShell | null = null;
+
+/* pending command awaiting a reply from the daemon */
+let pendingReply: {
+  resolve: (reply: ScraperReply) => void;
+  reject: (err: Error) => void;
+} | null = null;
+
+/* the daemon handles one command at a time, so commands are queued behind the
+   last one sent, settled or not */
+let commandQueue: Promise<unknown> = Promise.resolve();
+
+/* number of commands sent or waiting to be sent */
+let queuedCommands = 0;
+
+/* whether a data scraper run is sent or waiting to be sent */
+let runQueued = false;
+
+/* get the data scraper daemon, starting it if not already running */
+const getScraper = () => {
+  if (scraper) return scraper;
+
+  const daemon = new PythonShell("src/scraper/xgdata_scraper.py", {
+    mode: "json",
+    args: ["--daemon"],
+  });
+
+  daemon.on("message", (reply: ScraperReply) => {
+    pendingReply?.resolve(reply);
+    pendingReply = null;
+  });
+
+  daemon.on("stderr", (line: string) => {
+    // eslint-disable-next-line no-console
+    console.error(`Data scraper: ${line}`);
+  });
+
+  /* daemon exited, reject any pending command and restart on next run */
+  const onExit = (err?: Error) => {
+    if (scraper === daemon) scraper = null;
+    pendingReply?.reject(err || new Error("Data scraper daemon exited"));
+    pendingReply = null;
+  };
+  daemon.on("close", () => onExit());
+  daemon.on("pythonError", onExit);
+  daemon.on("error", onExit);
+
+  scraper = daemon;
+  return daemon;
+};
+
+/* send a command to the data scraper daemon, once any commands before it have
+   their replies, and wait for its reply */
+const sendCommand = (command: Record<string, unknown>) => {
+  queuedCommands += 1;
+  const reply = commandQueue.then(
+    () =>
+      new Promise<ScraperReply>((resolve, reject) => {
+        pendingReply = { resolve, reject };
+        getScraper().send(command);
+      })
+  );
+  const settled = reply.then(
+    () => {
+      queuedCommands -= 1;
+    },
+    () => {
+      queuedCommands -= 1;
+    }
+  );
+  commandQueue = settled;
+  return reply;
+};
+
 /* run data scraper */
 const runDataScraper = async () => {
-  // eslint-disable-next-line no-console
-  console.log("Running data scraper...");
+  /* skip this run if the previous one is still going, but wait for a fixtures
+     refresh to finish rather than skip the run */
+  if (runQueued) {
+    // eslint-disable-next-line no-console
+    console.log("Data scraper still running, skipping this run");
+    return;
+  }
 
-  /* run data scraper Python script */
-  await PythonShell.run("src/scraper/xgdata_scraper.py", undefined);
+  const fullRun = runCount % FULL_RUN_EVERY === 0;
+  runCount += 1;
+  runQueued = true;
 
   // eslint-disable-next-line no-console
-  console.log(
-    `Data scraper completed successfully at ${new Date().toLocaleString()}`
-  );
+  console.log(`Running ${fullRun ? "full" : "incremental"} data scraper...`);
+
+  try {
+    /* run data scraper in the Python daemon, resuming any interrupted run */
+    const reply = await sendCommand({
+      command: "run",
+      incremental: !fullRun,
+      resume: true,
+    });
+    if (reply.status !== "ok") throw new Error(reply.error);
+
+    // eslint-disable-next-line no-console
+    console.log(
+      `Data scraper completed successfully at ${new Date().toLocaleString()}`,
+      reply.summary
+    );
+  } catch (err) {
+    // eslint-disable-next-line no-console
+    console.error(`Data scraper failed at ${new Date().toLocaleString()}`, err);
+  } finally {
+    runQueued = false;
+  }
+};
+
+/* refresh team fixtures only, from the last run's team data */
+const refreshFixtures = async () => {
+  /* leave the daemon to any run, or refresh, in progress or queued */
+  if (queuedCommands > 0) return;
+
+  try {
+    const reply = await sendCommand({ command: "fixtures" });
+    if (reply.status !== "ok") throw new Error(reply.error);
+  } catch (err) {
+    // eslint-disable-next-line no-console
+    console.error(
+      `Fixtures refresh failed at ${new Date().toLocaleString()}`,
+      err
+    );
+  }
 };
 
 /* manual cron scheduler (4 hours) */
@@ -32,6 +165,7 @@ const runDataScraperOnTimeout = () => {
   setTimeout(() => {
     runDataScraper();
     setInterval(runDataScraper, INTERVAL);
+    setInterval(refreshFixtures, FIXTURES_INTERVAL);
   }, firstCall);
 };
 
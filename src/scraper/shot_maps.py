@@ -0,0 +1,215 @@
+# ###################################################################################
+# shot map aggregation for the xG data scraper
+# ###################################################################################
+# Bins every shot of the fpl season onto a grid over the attacking half, counting
+# shots, goals and xG per cell for each player, each team and the whole league,
+# with totals for the six-yard box, the rest of the penalty box and outside it.
+# All shots are loaded into columns once and each level is aggregated with one
+# bincount over (group, cell) codes, rather than clients re-binning raw shots on
+# every render. Grids are saved as uncompressed numpy arrays, one .npz file per
+# season, so reads load just the arrays they use. Disable with SCRAPER_SHOT_MAPS=0.
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import columnar_store
+
+SHOT_MAPS_DIR = 'src/scraper/data/shot_maps'
+
+ENABLED = os.environ.get('SCRAPER_SHOT_MAPS', '1') != '0'
+
+# grid cells along the pitch (understat X) and across it (Y). The grid covers X
+# from X_RANGE[0] to the goal line, shots from further out counting in the first row
+GRID = (10, 10)
+X_RANGE = (0.5, 1.0)
+
+# zones in understat coordinates, goal at X = 1: penalty box and six-yard box
+BOX_X, BOX_Y = 0.83, (0.21, 0.79)
+SIX_YARD_X, SIX_YARD_Y = 0.94, (0.37, 0.63)
+ZONES = ['outside', 'box', 'six_yard']
+
+# levels aggregated, each saved with its group keys
+LEVELS = ['player', 'team', 'league']
+
+# shot columns used, with the understat player id, as loaded from either source
+SHOT_COLUMNS = ['X', 'Y', 'xG', 'result', 'h_a', 'h_team', 'a_team']
+
+
+def shot_maps_file(season, root=SHOT_MAPS_DIR):
+    return os.path.join(root, f'shot_maps_{season}.npz')
+
+
+# ###################################################################################
+# load a season's shots into columns
+# ###################################################################################
+# from the columnar store, in one scan of the season's partitions, reading only
+# the given players' rows
+def shots_from_columnar(season, player_ids):
+    return columnar_store.read_shots(SHOT_COLUMNS + ['player_id'], seasons=[season], players=player_ids).to_pandas()
+
+
+# from each asset's shot dataset
+def shots_from_datasets(season, asset_ids, read):
+    records = []
+    for asset_id in asset_ids:
+        data = read(asset_id, 'shotdata')
+        if data:
+            records.extend(shot for shot in data.get('shotdata', []) if str(shot.get('season')) == str(season))
+    return pd.DataFrame.from_records(records, columns=SHOT_COLUMNS + ['player_id'])
+
+
+# shots of the season keyed by fpl asset and shooting team title, as columns. Only
+# shots by players matched to an fpl asset, for one of team_titles, are kept
+def load_shots(season, asset_xg_matches, team_titles, read):
+    player_assets = {int(xg_code): asset_id for asset_id, xg_code in asset_xg_matches.items() if xg_code is not None}
+    if columnar_store.ENABLED and os.path.isdir(os.path.join(columnar_store.STORE_DIR, 'shots')):
+        frame = shots_from_columnar(season, list(player_assets))
+    else:
+        frame = shots_from_datasets(season, player_assets.values(), read)
+
+    player_ids = pd.to_numeric(frame['player_id'].astype(object), errors='coerce')
+    teams = pd.Series(np.where(frame['h_a'] == 'h', frame['h_team'], frame['a_team']).astype(str), index=frame.index)
+    kept = (player_ids.isin(player_assets) & teams.isin(set(team_titles))).to_numpy()
+    frame, player_ids, teams = frame[kept], player_ids[kept], teams[kept]
+
+    return {
+        'X': pd.to_numeric(frame['X'], errors='coerce').fillna(0).to_numpy(dtype=float),
+        'Y': pd.to_numeric(frame['Y'], errors='coerce').fillna(0.5).to_numpy(dtype=float),
+        'xG': pd.to_numeric(frame['xG'], errors='coerce').fillna(0).to_numpy(dtype=float),
+        'goal': (frame['result'] == 'Goal').to_numpy(),
+        'asset': player_ids.map(player_assets).to_numpy(dtype=np.int64),
+        'team': teams.to_numpy(dtype=str),
+    }
+
+
+# ###################################################################################
+# bin shots for every group of a level at once
+# ###################################################################################
+# grid cell of each shot, flattened row major
+def grid_cells(x, y):
+    rows = np.clip(((x - X_RANGE[0]) / (X_RANGE[1] - X_RANGE[0]) * GRID[0]).astype(int), 0, GRID[0] - 1)
+    columns = np.clip((y * GRID[1]).astype(int), 0, GRID[1] - 1)
+    return rows * GRID[1] + columns
+
+
+# zone index of each shot, see ZONES
+def shot_zones(x, y):
+    in_box = (x >= BOX_X) & (y >= BOX_Y[0]) & (y <= BOX_Y[1])
+    in_six_yard = (x >= SIX_YARD_X) & (y >= SIX_YARD_Y[0]) & (y <= SIX_YARD_Y[1])
+    return np.where(in_six_yard, 2, np.where(in_box, 1, 0))
+
+
+# shots, goals and xG per group and bin, for bins codes in [0, bins) and groups
+# codes in [0, size), as (size, bins) arrays
+def bin_counts(groups, codes, bins, size, goal, xg):
+    flat = groups * bins + codes
+    shape = (size, bins)
+    return (
+        np.bincount(flat, minlength=size * bins).reshape(shape).astype(np.uint32),
+        np.bincount(flat[goal], minlength=size * bins).reshape(shape).astype(np.uint32),
+        np.bincount(flat, weights=xg, minlength=size * bins).reshape(shape).astype(np.float32),
+    )
+
+
+# {name: array} of grids and zone totals for each level. team_ids maps team titles
+# to fpl team ids, -1 where a team has none
+def aggregate_shots(shots, team_ids):
+    cells = grid_cells(shots['X'], shots['Y'])
+    zones = shot_zones(shots['X'], shots['Y'])
+
+    player = shots['asset'] >= 0
+    player_keys, player_groups = np.unique(shots['asset'][player], return_inverse=True)
+    team_keys, team_groups = np.unique(shots['team'], return_inverse=True)
+    levels = {
+        'player': (player_keys, player_groups, player),
+        'team': (team_keys, team_groups, slice(None)),
+        'league': (np.array(['league']), np.zeros(len(cells), dtype=np.int64), slice(None)),
+    }
+
+    arrays = {'grid': np.array(GRID), 'x_range': np.array(X_RANGE), 'zones': np.array(ZONES)}
+    for level, (keys, groups, selected) in levels.items():
+        goal, xg = shots['goal'][selected], shots['xG'][selected]
+        arrays[f'{level}_keys'] = keys
+        arrays[f'{level}_shots'], arrays[f'{level}_goals'], arrays[f'{level}_xG'] = (
+            counts.reshape(len(keys), *GRID)
+            for counts in bin_counts(groups, cells[selected], GRID[0] * GRID[1], len(keys), goal, xg)
+        )
+        (arrays[f'{level}_zone_shots'], arrays[f'{level}_zone_goals'],
+         arrays[f'{level}_zone_xG']) = bin_counts(groups, zones[selected], len(ZONES), len(keys), goal, xg)
+    arrays['team_ids'] = np.array([team_ids.get(title, -1) for title in team_keys], dtype=np.int64)
+    return arrays
+
+
+def save_shot_maps(arrays, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_file = path + '.temp'
+    with open(temp_file, 'wb') as outfile:
+        np.savez(outfile, **arrays)
+    os.replace(temp_file, path)
+
+
+# ###################################################################################
+# read shot maps back
+# ###################################################################################
+class ShotMaps:
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.index = {level: {key: row for row, key in enumerate(arrays[f'{level}_keys'].tolist())} for level in LEVELS}
+        # fpl team ids to team titles, for teams linked to one
+        self.team_titles = {
+            team_id: title for team_id, title in zip(arrays['team_ids'].tolist(), arrays['team_keys'].tolist())
+            if team_id >= 0
+        }
+
+    # the shot map of a group as plain data: grids indexed [X row][Y column], and
+    # totals by zone. None if the group has no shots
+    def get(self, level, key):
+        row = self.index[level].get(key)
+        if row is None:
+            return None
+        arrays = self.arrays
+        return {
+            'grid': arrays['grid'].tolist(),
+            'x_range': arrays['x_range'].tolist(),
+            'shots': arrays[f'{level}_shots'][row].tolist(),
+            'goals': arrays[f'{level}_goals'][row].tolist(),
+            'xG': np.round(arrays[f'{level}_xG'][row], 4).tolist(),
+            'zones': {
+                zone: {
+                    'shots': int(arrays[f'{level}_zone_shots'][row, column]),
+                    'goals': int(arrays[f'{level}_zone_goals'][row, column]),
+                    'xG': round(float(arrays[f'{level}_zone_xG'][row, column]), 4),
+                }
+                for column, zone in enumerate(arrays['zones'].tolist())
+            },
+        }
+
+    def player(self, asset_id):
+        return self.get('player', asset_id)
+
+    def team(self, team_id):
+        title = self.team_titles.get(team_id)
+        return self.get('team', title) if title is not None else None
+
+    def league(self):
+        return self.get('league', 'league')
+
+
+def load_shot_maps(season, root=SHOT_MAPS_DIR):
+    path = shot_maps_file(season, root)
+    if not os.path.isfile(path):
+        return None
+    with np.load(path) as npz:
+        return ShotMaps({name: npz[name] for name in npz.files})
+
+
+# aggregate and save the shot maps of the fpl season, returning them. team_ids maps
+# the fpl league's team titles to fpl team ids, -1 where a team has none
+def build_season_shot_maps(season, asset_xg_matches, team_ids, read, root=SHOT_MAPS_DIR):
+    shots = load_shots(season, asset_xg_matches, team_ids.keys(), read)
+    arrays = aggregate_shots(shots, team_ids)
+    save_shot_maps(arrays, shot_maps_file(season, root))
+    logging.info(f'Binned {len(shots["X"])} shots of {len(arrays["player_keys"])} players for season {season}')
+    return ShotMaps(arrays)
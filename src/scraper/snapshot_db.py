@@ -0,0 +1,166 @@
+# ###################################################################################
+# SQLite snapshot store for the xG data scraper
+# ###################################################################################
+# Each run is also written into an indexed SQLite database, so local queries such
+# as "players on team X sorted by xG90" do not need to load every JSON output.
+# Tables hold the latest state of assets, teams, fixtures, shots and matches, with
+# typed columns for the fields worth querying and the full record as JSON in
+# `data`. A row is only rewritten when its record changes, and updated_run records
+# the run that last changed it, so diffing runs is a query on updated_run. The
+# database runs in WAL mode so readers never block the scraper writing to it.
+from datetime import datetime
+import json
+import os
+import sqlite3
+
+DB_FILE = 'src/scraper/data/snapshot.db'
+
+# disable with SCRAPER_SNAPSHOT_DB=0
+ENABLED = os.environ.get('SCRAPER_SNAPSHOT_DB', '1') != '0'
+
+# table: (primary key, [(column, type)]), each column taken from the record field of
+# the same name
+TABLES = {
+    'assets': (('id',), [
+        ('id', 'INTEGER'), ('team', 'INTEGER'), ('team_code', 'INTEGER'), ('element_type', 'INTEGER'),
+        ('web_name', 'TEXT'), ('now_cost', 'INTEGER'), ('minutes', 'INTEGER'), ('total_points', 'INTEGER'),
+        ('xg_code', 'TEXT'), ('xG', 'REAL'), ('xA', 'REAL'), ('npxG', 'REAL'), ('xG90', 'REAL'),
+        ('xA90', 'REAL'), ('npxG90', 'REAL'), ('shots90', 'REAL'), ('kp90', 'REAL'),
+        ('xG_diff', 'REAL'), ('xA_diff', 'REAL'), ('xGA90', 'REAL'),
+    ]),
+    'teams': (('id',), [
+        ('id', 'INTEGER'), ('code', 'INTEGER'), ('name', 'TEXT'), ('short_name', 'TEXT'), ('title', 'TEXT'),
+        ('pts', 'INTEGER'), ('xG', 'REAL'), ('xGA', 'REAL'), ('xpts', 'REAL'), ('xG90', 'REAL'), ('xGA90', 'REAL'),
+    ]),
+    'fixtures': (('id',), [
+        ('id', 'INTEGER'), ('event', 'INTEGER'), ('kickoff_time', 'TEXT'), ('team_h', 'INTEGER'),
+        ('team_a', 'INTEGER'), ('team_h_difficulty', 'INTEGER'), ('team_a_difficulty', 'INTEGER'),
+        ('team_h_score', 'INTEGER'), ('team_a_score', 'INTEGER'), ('finished', 'INTEGER'),
+    ]),
+    'shots': (('player_id', 'id'), [
+        ('id', 'INTEGER'), ('player_id', 'INTEGER'), ('season', 'INTEGER'), ('match_id', 'INTEGER'),
+        ('minute', 'INTEGER'), ('result', 'TEXT'), ('situation', 'TEXT'), ('shotType', 'TEXT'),
+        ('x', 'REAL'), ('y', 'REAL'), ('xG', 'REAL'),
+    ]),
+    'matches': (('player_id', 'id'), [
+        ('player_id', 'INTEGER'), ('id', 'INTEGER'), ('season', 'INTEGER'), ('date', 'TEXT'),
+        ('position', 'TEXT'), ('time', 'INTEGER'), ('goals', 'INTEGER'), ('shots', 'INTEGER'),
+        ('assists', 'INTEGER'), ('key_passes', 'INTEGER'), ('xG', 'REAL'), ('xA', 'REAL'), ('npxG', 'REAL'),
+    ]),
+}
+
+# (table, indexed columns)
+INDEXES = [
+    ('assets', ('team',)),
+    ('assets', ('element_type',)),
+    ('assets', ('team', 'xG90')),
+    ('assets', ('xG90',)),
+    ('assets', ('xA90',)),
+    ('assets', ('npxG90',)),
+    ('assets', ('now_cost',)),
+    ('teams', ('code',)),
+    ('fixtures', ('team_h',)),
+    ('fixtures', ('team_a',)),
+    ('fixtures', ('event',)),
+    ('shots', ('player_id', 'season')),
+    ('shots', ('season',)),
+    ('shots', ('match_id',)),
+    ('matches', ('season',)),
+    ('matches', ('id',)),
+]
+
+# every table also carries the full record and the run that last changed it
+for primary_key, columns in TABLES.values():
+    columns.extend([('data', 'TEXT'), ('updated_run', 'INTEGER')])
+
+
+class SnapshotStore:
+    def __init__(self, db_file=DB_FILE):
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.run_id = None
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS runs ('
+                'run_id INTEGER PRIMARY KEY AUTOINCREMENT, started_at TEXT, completed_at TEXT, '
+                'incremental INTEGER, season INTEGER, gameweek INTEGER)'
+            )
+            for table, (primary_key, columns) in TABLES.items():
+                self.conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} ('
+                    + ', '.join(f'{column} {column_type}' for column, column_type in columns)
+                    + f', PRIMARY KEY ({", ".join(primary_key)}))'
+                )
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_updated_run ON {table} (updated_run)')
+            for table, columns in INDEXES:
+                self.conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS {table}_{"_".join(columns)} ON {table} '
+                    f'({", ".join(columns)})'
+                )
+
+    # insert or update records, only touching rows whose record has changed
+    def _upsert(self, table, records):
+        primary_key, columns = TABLES[table]
+        names = [column for column, _ in columns]
+        updates = [name for name in names if name not in primary_key]
+        sql = (
+            f'INSERT INTO {table} ({", ".join(names)}) '
+            f'VALUES ({", ".join("?" * len(names))}) '
+            f'ON CONFLICT ({", ".join(primary_key)}) DO UPDATE SET '
+            + ', '.join(f'{name} = excluded.{name}' for name in updates)
+            + ' WHERE data IS NOT excluded.data'
+        )
+        rows = []
+        for record in records:
+            row = [record.get(name) for name in names[:-2]]
+            row.append(json.dumps(record, sort_keys=True, separators=(',', ':')))
+            row.append(self.run_id)
+            rows.append(row)
+        self.conn.executemany(sql, rows)
+
+    # remove rows whose primary key is no longer in a complete set of records
+    def _delete_missing(self, table, records):
+        (key,), _ = TABLES[table]
+        current = {record[key] for record in records}
+        stale = [(row[0],) for row in self.conn.execute(f'SELECT {key} FROM {table}') if row[0] not in current]
+        self.conn.executemany(f'DELETE FROM {table} WHERE {key} = ?', stale)
+
+    def start_run(self, incremental=False):
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO runs (started_at, incremental) VALUES (?, ?)',
+                (datetime.now().isoformat(), int(incremental))
+            )
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+    # replace the shots and matches of an understat player from a parsed player page
+    def write_player(self, player_id, datasets):
+        with self.conn:
+            if datasets.get('shotdata'):
+                self._upsert('shots', datasets['shotdata'])
+            if datasets.get('matchesdata'):
+                self._upsert('matches', [dict(match, player_id=player_id) for match in datasets['matchesdata']])
+
+    # write the final assets, teams and fixtures of the run and mark it complete
+    def write_snapshot(self, fpl_asset_data, team_data, fixtures, season=None, gameweek=None):
+        teams = [team for team in team_data if team]
+        with self.conn:
+            for table, records in (('assets', fpl_asset_data), ('teams', teams), ('fixtures', fixtures)):
+                self._upsert(table, records)
+                self._delete_missing(table, records)
+            self.conn.execute(
+                'UPDATE runs SET completed_at = ?, season = ?, gameweek = ? WHERE run_id = ?',
+                (datetime.now().isoformat(), season, gameweek, self.run_id)
+            )
+
+    # teams written by the last run, in the order they were first written
+    def load_teams(self):
+        return [json.loads(data) for data, in self.conn.execute('SELECT data FROM teams ORDER BY rowid')]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,46 @@
+# ###################################################################################
+# team fixtures stage for the xG data scraper
+# ###################################################################################
+# Each team's upcoming fixtures are built from the FPL fixtures feed, fetched once
+# per run, rather than taken from whichever of its players' element summaries was
+# merged last. The feed is indexed by team in a single pass, with every fixture
+# seen from both sides, so team output no longer depends on fetching every
+# player's summary and can be refreshed on its own.
+
+
+# a feed fixture from one team's side, in the element-summary fixture format
+def team_fixture(fixture, is_home):
+    return {
+        'id': fixture['id'],
+        'code': fixture.get('code'),
+        'team_h': fixture['team_h'],
+        'team_h_score': fixture.get('team_h_score'),
+        'team_a': fixture['team_a'],
+        'team_a_score': fixture.get('team_a_score'),
+        'event': fixture.get('event'),
+        'finished': fixture.get('finished', False),
+        'minutes': fixture.get('minutes', 0),
+        'provisional_start_time': fixture.get('provisional_start_time', False),
+        'kickoff_time': fixture.get('kickoff_time'),
+        'event_name': f'Gameweek {fixture["event"]}' if fixture.get('event') is not None else None,
+        'is_home': is_home,
+        'difficulty': fixture.get('team_h_difficulty' if is_home else 'team_a_difficulty'),
+    }
+
+
+# upcoming fixtures of every team in the feed, in feed (kickoff) order, keyed by
+# FPL team id
+def index_fixtures(fixtures):
+    fixtures_by_team = {}
+    for fixture in fixtures:
+        if fixture.get('finished'):
+            continue
+        fixtures_by_team.setdefault(fixture['team_h'], []).append(team_fixture(fixture, True))
+        fixtures_by_team.setdefault(fixture['team_a'], []).append(team_fixture(fixture, False))
+    return fixtures_by_team
+
+
+# team outputs, one per team in the dataset, each with its upcoming fixtures
+def build_team_fixtures(teams, fixtures):
+    fixtures_by_team = index_fixtures(fixtures)
+    return [dict(team, fixtures=fixtures_by_team.get(team.get('id'), [])) for team in teams]
@@ -0,0 +1,201 @@
+# ###################################################################################
+# team registry for the xG data scraper
+# ###################################################################################
+# Maps teams between understat (team id and title) and FPL (team code, and the
+# team id, which changes each season) with dictionary indexes, so every team join
+# is a single lookup. Understat teams are registered per league and season from
+# the fetched league pages. The teams of the league season matching the FPL game
+# are linked to FPL teams by code: first from the links already made, then from
+# KNOWN_TEAMS, and otherwise by the players the teams share, falling back to their
+# names. Links are cached in REGISTRY_FILE between runs, so promoted clubs are
+# picked up without code edits.
+import json
+import logging
+import os
+
+from name_matcher import normalise_name
+
+REGISTRY_FILE = 'src/scraper/data/team_registry.json'
+
+# hand checked understat team id -> FPL team code links
+KNOWN_TEAMS = {
+    '71': 7,     # Aston Villa
+    '72': 11,    # Everton
+    '73': 91,    # Bournemouth
+    '74': 20,    # Southampton
+    '75': 13,    # Leicester
+    '76': 35,    # West Bromwich Albion
+    '78': 31,    # Crystal Palace
+    '79': 45,    # Norwich
+    '80': 8,     # Chelsea
+    '81': 21,    # West Ham
+    '82': 6,     # Tottenham
+    '83': 3,     # Arsenal
+    '86': 4,     # Newcastle United
+    '87': 14,    # Liverpool
+    '88': 43,    # Manchester City
+    '89': 1,     # Manchester United
+    '90': 57,    # Watford
+    '92': 90,    # Burnley
+    '220': 36,   # Brighton
+    '228': 54,   # Fulham
+    '229': 39,   # Wolverhampton Wanderers
+    '238': 49,   # Sheffield United
+    '244': 94,   # Brentford
+    '245': 2,    # Leeds
+    '249': 17,   # Nottingham Forest
+}
+
+# players two teams must share before they are linked by their squads
+MIN_SHARED_PLAYERS = 3
+
+# name tokens too common to link two teams by
+COMMON_NAME_TOKENS = {'fc', 'afc', 'city', 'united', 'utd', 'town', 'athletic'}
+
+
+def partition_key(league, season):
+    return f'{league}/{season}'
+
+
+# understat players of each team title, players who moved mid-season counting for
+# both teams
+def players_by_title(players_data):
+    players = {}
+    for player in players_data:
+        for title in player['team_title'].split(','):
+            players.setdefault(title.strip(), []).append(normalise_name(player['player_name']))
+    return players
+
+
+# number of an FPL team's elements found in an understat squad, by web name
+def shared_players(names, elements):
+    shared = 0
+    for element in elements:
+        web_name = normalise_name(element['web_name'])
+        if web_name and any(web_name in name for name in names):
+            shared += 1
+    return shared
+
+
+def name_tokens(name):
+    return set(normalise_name(name).replace("'", ' ').replace('.', ' ').split()) - COMMON_NAME_TOKENS
+
+
+class TeamRegistry:
+    def __init__(self, registry_file=REGISTRY_FILE):
+        self.registry_file = registry_file
+        # {league/season: {understat team id: {'title': title, 'fpl_code': code}}}
+        self.partitions = {}
+        # whether partitions have changed since they were last saved
+        self.dirty = False
+        if registry_file and os.path.isfile(registry_file):
+            try:
+                with open(registry_file) as infile:
+                    self.partitions = json.load(infile)
+            except ValueError:
+                logging.warning(f'Discarding corrupt team registry {registry_file}')
+
+        # indexes of the linked league season, rebuilt by link_fpl
+        self.by_understat_id = {}
+        self.by_title = {}
+        self.by_fpl_code = {}
+        self.by_fpl_id = {}
+
+    # record the understat teams of a league season, keeping any links already made
+    def register(self, league, season, teams_data):
+        partition = self.partitions.setdefault(partition_key(league, season), {})
+        for team_id, team in teams_data.items():
+            entry = partition.setdefault(team_id, {})
+            if entry.get('title') != team['title']:
+                entry['title'] = team['title']
+                self.dirty = True
+        return partition
+
+    # link the understat teams of the FPL game's league season to the FPL teams,
+    # rebuild the indexes and save any changes
+    def link_fpl(self, league, season, teams_data, players_data, fpl_json_data):
+        partition = self.register(league, season, teams_data)
+        fpl_teams = {team['code']: team for team in fpl_json_data['teams']}
+
+        # {understat team id: fpl code}, from links made by previous runs, then the
+        # hand checked ones
+        codes = {}
+        unlinked_codes = set(fpl_teams)
+        for links in ({team_id: partition[team_id].get('fpl_code') for team_id in teams_data}, KNOWN_TEAMS):
+            for team_id, code in links.items():
+                if team_id in teams_data and team_id not in codes and code in unlinked_codes:
+                    codes[team_id] = code
+                    unlinked_codes.discard(code)
+
+        unlinked = [team_id for team_id in teams_data if team_id not in codes]
+        if unlinked and unlinked_codes:
+            self._link_unknown(partition, unlinked, unlinked_codes, codes, players_data, fpl_json_data)
+
+        for team_id in teams_data:
+            if partition[team_id].get('fpl_code') != codes.get(team_id):
+                partition[team_id]['fpl_code'] = codes.get(team_id)
+                self.dirty = True
+
+        self._index(partition, teams_data, fpl_teams)
+        if self.dirty:
+            self.save()
+        return self
+
+    # link teams neither cached nor known, by shared players then by name, adding
+    # them to codes
+    def _link_unknown(self, partition, unlinked, unlinked_codes, codes, players_data, fpl_json_data):
+        squads = players_by_title(players_data)
+        elements = {}
+        for element in fpl_json_data['elements']:
+            elements.setdefault(element['team_code'], []).append(element)
+        fpl_names = {team['code']: team['name'] for team in fpl_json_data['teams']}
+
+        scores = []
+        for team_id in unlinked:
+            names = squads.get(partition[team_id]['title'], [])
+            for code in unlinked_codes:
+                shared = shared_players(names, elements.get(code, []))
+                if shared >= MIN_SHARED_PLAYERS:
+                    scores.append((shared, team_id, code))
+
+        for shared, team_id, code in sorted(scores, reverse=True):
+            if code in unlinked_codes and team_id not in codes:
+                codes[team_id] = code
+                unlinked_codes.discard(code)
+                logging.info(f'Linked {partition[team_id]["title"]} to FPL team {fpl_names[code]} by {shared} players')
+
+        for team_id in unlinked:
+            if team_id in codes:
+                continue
+            tokens = name_tokens(partition[team_id]['title'])
+            candidates = [code for code in unlinked_codes if tokens & name_tokens(fpl_names[code])]
+            if len(candidates) == 1:
+                codes[team_id] = candidates[0]
+                unlinked_codes.discard(candidates[0])
+                logging.info(f'Linked {partition[team_id]["title"]} to FPL team {fpl_names[candidates[0]]} by name')
+            else:
+                logging.warning(f'No FPL team found for {partition[team_id]["title"]}')
+
+    def _index(self, partition, teams_data, fpl_teams):
+        self.by_understat_id, self.by_title, self.by_fpl_code, self.by_fpl_id = {}, {}, {}, {}
+        for team_id in teams_data:
+            entry = {'understat_id': team_id, 'title': partition[team_id]['title']}
+            fpl_team = fpl_teams.get(partition[team_id].get('fpl_code'))
+            if fpl_team is not None:
+                entry.update(
+                    code=fpl_team['code'], id=fpl_team['id'], name=fpl_team['name'],
+                    short_name=fpl_team['short_name'],
+                )
+                self.by_fpl_code[fpl_team['code']] = entry
+                self.by_fpl_id[fpl_team['id']] = entry
+            self.by_understat_id[team_id] = entry
+            self.by_title[entry['title']] = entry
+
+    def save(self):
+        self.dirty = False
+        if not self.registry_file:
+            return
+        temp_file = self.registry_file + '.temp'
+        with open(temp_file, 'w') as outfile:
+            json.dump(self.partitions, outfile, indent=4, sort_keys=True)
+        os.replace(temp_file, self.registry_file)
@@ -0,0 +1,130 @@
+# ###################################################################################
+# stage timing, run summaries and profiling for the xG data scraper
+# ###################################################################################
+# Every stage of a run records its call count and time in the shared `stages`
+# timer. Pipeline stages (bootstrap fetch, league fetch and parse, merge...) are
+# timed as wall time. Per-item stages running across worker threads or processes
+# (summary and player page fetches, page parses, file writes, Firestore batch
+# commits) add up the time of each call, so they can exceed the run's wall time.
+#
+# Each completed run's summary is written to RUN_SUMMARY_FILE and appended to
+# RUN_SUMMARY_LOG as one JSON line. Set SCRAPER_PROFILE to "cpu", "memory" or
+# "cpu,memory" to also capture a cProfile of the run's main thread and the top
+# tracemalloc allocation sites into the logs directory.
+import cProfile
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+LOGSDIR = 'src/scraper/data/logs'
+RUN_SUMMARY_FILE = LOGSDIR + '/run_summary.json'
+RUN_SUMMARY_LOG = LOGSDIR + '/run_summaries.jsonl'
+
+PROFILE = {mode.strip() for mode in os.environ.get('SCRAPER_PROFILE', '').split(',') if mode.strip()}
+
+# number of allocation sites kept in a tracemalloc report
+TRACEMALLOC_TOP = 25
+
+
+class StageTimer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def add(self, stage, seconds, calls=1):
+        with self.lock:
+            counter = self.counters.setdefault(stage, {'calls': 0, 'seconds': 0.0})
+            counter['calls'] += calls
+            counter['seconds'] += seconds
+
+    @contextmanager
+    def stage(self, stage, calls=1):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started, calls)
+
+    # wrap a function so each call is timed as a stage
+    def timed(self, stage, func):
+        def timed_func(*args, **kwargs):
+            with self.stage(stage):
+                return func(*args, **kwargs)
+        return timed_func
+
+    # snapshot of the stage counters
+    def stats(self):
+        with self.lock:
+            return {stage: dict(counter) for stage, counter in self.counters.items()}
+
+
+# timer shared by every stage of the run
+stages = StageTimer()
+
+
+# calls and time of each stage since a previous snapshot of the stage counters
+def stage_delta(before, after):
+    delta = {}
+    for stage, counter in after.items():
+        previous = before.get(stage, {'calls': 0, 'seconds': 0.0})
+        calls = counter['calls'] - previous['calls']
+        if calls:
+            delta[stage] = {'calls': calls, 'seconds': round(counter['seconds'] - previous['seconds'], 3)}
+    return delta
+
+
+# write a run summary as the latest summary, and append it to the summary log
+def write_run_summary(summary, summary_file=RUN_SUMMARY_FILE, summary_log=RUN_SUMMARY_LOG):
+    os.makedirs(os.path.dirname(summary_file), exist_ok=True)
+    temp_file = summary_file + '.temp'
+    with open(temp_file, 'w') as outfile:
+        json.dump(summary, outfile, indent=4, sort_keys=True)
+    os.replace(temp_file, summary_file)
+
+    with open(summary_log, 'a') as outfile:
+        outfile.write(json.dumps(summary, sort_keys=True) + '\n')
+
+
+# profile the enclosed block as SCRAPER_PROFILE asks. Yields a dict that is filled
+# in with the files written, and the peak traced memory, once the block exits.
+@contextmanager
+def profile_run(modes=PROFILE, logsdir=LOGSDIR):
+    report = {}
+    if not modes:
+        yield report
+        return
+
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    profiler = cProfile.Profile() if 'cpu' in modes else None
+    tracing = 'memory' in modes and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+
+    try:
+        yield report
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        # snapshot allocations before writing any reports
+        if tracing:
+            snapshot = tracemalloc.take_snapshot()
+            report['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        os.makedirs(logsdir, exist_ok=True)
+        if profiler is not None:
+            report['cpu_profile'] = os.path.join(logsdir, f'profile-{stamp}.prof')
+            profiler.dump_stats(report['cpu_profile'])
+        if tracing:
+            report['memory_profile'] = os.path.join(logsdir, f'tracemalloc-{stamp}.txt')
+            with open(report['memory_profile'], 'w') as outfile:
+                for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                    outfile.write(f'{stat}\n')
+        logging.info(f'Profiling output: {report}')
@@ -0,0 +1,45 @@
+# ###################################################################################
+# tests for the leaderboards stage
+# ###################################################################################
+import unittest
+
+from leaderboards import build_asset_boards, build_team_boards, column_table
+
+
+def asset(asset_id, **fields):
+    return dict({'id': asset_id, 'web_name': f'Player {asset_id}', 'team': 1, 'element_type': 3,
+                 'now_cost': 60, 'minutes': 900}, **fields)
+
+
+class LeaderboardsTest(unittest.TestCase):
+    def test_understat_strings_are_ranked(self):
+        # matched assets carry understat fields as numeric strings, unmatched ones 0
+        assets = [asset(1, xG=0), asset(2, xG='4.5'), asset(3, xG='1.25'), asset(4, xG=0)]
+        entries = build_asset_boards(assets, size=3, min_minutes=90)['xG_ALL_all']['entries']
+        self.assertEqual([(entry['id'], entry['value']) for entry in entries], [(2, 4.5), (3, 1.25), (1, 0.0)])
+
+    def test_missing_and_unparsable_values_are_left_out(self):
+        table = column_table([{'xG': 'n/a'}, {}, {'xG': '0.5'}], ['xG'])
+        self.assertEqual(table.shape, (3, 1))
+        entries = build_asset_boards([asset(1, xG='n/a'), asset(2)], size=5)['xG_MID_5to7']['entries']
+        self.assertEqual(entries, [])
+
+    def test_filters_by_position_band_and_minutes(self):
+        assets = [
+            asset(1, xG90=0.9, element_type=4), asset(2, xG90=0.5, now_cost=95),
+            asset(3, xG90=0.7, minutes=10), asset(4, xG90=0.3),
+        ]
+        boards = build_asset_boards(assets, size=5, min_minutes=90)
+        self.assertEqual([entry['id'] for entry in boards['xG90_MID_all']['entries']], [2, 4])
+        self.assertEqual([entry['id'] for entry in boards['xG90_MID_5to7']['entries']], [4])
+        self.assertEqual([entry['id'] for entry in boards['xG90_ALL_all']['entries']], [1, 2, 4])
+
+    def test_ascending_team_metrics(self):
+        teams = [{'id': 1, 'title': 'A', 'xGA90': 1.5}, {'id': 2, 'title': 'B', 'xGA90': 0.8}]
+        board = build_team_boards(teams)['team_xGA90']
+        self.assertEqual(board['order'], 'ascending')
+        self.assertEqual([entry['id'] for entry in board['entries']], [2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
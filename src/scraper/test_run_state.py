@@ -0,0 +1,59 @@
+# ###################################################################################
+# tests for incremental run planning
+# ###################################################################################
+from datetime import datetime, timezone
+import unittest
+
+from run_state import MATCH_LENGTH, REFRESH_WINDOW, build_run_state, plan_refresh
+
+HOUR = 60 * 60
+T0 = datetime(2022, 10, 1, 12, tzinfo=timezone.utc).timestamp()
+
+BOOTSTRAP = {
+    'events': [{'id': 9, 'is_current': True, 'deadline_time': '2022-08-05T17:30:00Z'}],
+    'elements': [{'id': 1, 'team': 1}, {'id': 2, 'team': 2}],
+}
+
+
+def fixture(fixture_id, kickoff, team_h, team_a, finished=True):
+    kickoff_time = datetime.fromtimestamp(kickoff, timezone.utc).isoformat().replace('+00:00', 'Z')
+    return {'id': fixture_id, 'kickoff_time': kickoff_time, 'team_h': team_h, 'team_a': team_a,
+            'finished': finished, 'finished_provisional': finished}
+
+
+def saved_state(fixtures, completed_at):
+    fixture_state, _ = plan_refresh(BOOTSTRAP, fixtures, {}, now=completed_at)
+    return build_run_state(BOOTSTRAP, fixture_state, now=completed_at)
+
+
+class PlanRefreshTest(unittest.TestCase):
+    def test_first_run_is_full(self):
+        _, refresh_teams = plan_refresh(BOOTSTRAP, [fixture(1, T0 - HOUR, 1, 2)], {}, now=T0)
+        self.assertIsNone(refresh_teams)
+
+    def test_long_finished_fixtures_are_not_dirty(self):
+        # fixtures first seen now, but long finished, are seeded from their kickoff
+        state = saved_state([], T0)
+        fixtures = [fixture(1, T0 - 10 * 24 * HOUR, 1, 2)]
+        _, refresh_teams = plan_refresh(BOOTSTRAP, fixtures, state, now=T0 + HOUR)
+        self.assertEqual(refresh_teams, set())
+
+    def test_fixture_finished_within_window_is_dirty(self):
+        state = saved_state([fixture(1, T0 + HOUR, 1, 2, finished=False)], T0)
+        fixtures = [fixture(1, T0 + HOUR, 1, 2)]
+        fixture_state, refresh_teams = plan_refresh(BOOTSTRAP, fixtures, state, now=T0 + 4 * HOUR)
+        self.assertEqual(refresh_teams, {1, 2})
+        self.assertEqual(fixture_state['1']['seen'], T0 + HOUR + MATCH_LENGTH)
+
+    def test_fixture_finished_since_last_success_is_dirty_after_window(self):
+        # runs failed for longer than the refresh window after the match
+        state = saved_state([], T0)
+        fixtures = [fixture(1, T0 + HOUR, 1, 2), fixture(2, T0 - 10 * 24 * HOUR, 3, 4)]
+        now = T0 + 30 * HOUR
+        self.assertGreater(now - (T0 + HOUR + MATCH_LENGTH), REFRESH_WINDOW)
+        _, refresh_teams = plan_refresh(BOOTSTRAP, fixtures, state, now=now)
+        self.assertEqual(refresh_teams, {1, 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
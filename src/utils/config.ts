@@ -5,6 +5,10 @@ dotenv.config();
 
 const PORT = (process.env.PORT as string) || "3000";
 
+/* port of the data scraper daemon's read service, see src/scraper/read_service.py */
+const READ_PORT = (process.env.SCRAPER_READ_PORT as string) || "8300";
+
 export default {
   PORT,
+  READ_PORT,
 };